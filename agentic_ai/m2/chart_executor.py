@@ -0,0 +1,245 @@
+import json
+import os
+import queue
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+
+from shared_frame import SharedFrame
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chart_worker.py")
+
+# Defaults for every job; override per executor or per call
+CHART_TIMEOUT = float(os.getenv("CHART_TIMEOUT", "60"))
+CHART_CPU_SECONDS = float(os.getenv("CHART_CPU_SECONDS", "30"))
+CHART_MEMORY_MB = int(os.getenv("CHART_MEMORY_MB", "1024"))
+# Seconds a worker may take to import pandas/matplotlib and load the dataset
+WORKER_STARTUP_TIMEOUT = float(os.getenv("CHART_WORKER_STARTUP_TIMEOUT", "120"))
+
+
+@dataclass
+class ChartResult:
+    """Outcome of running one block of generated chart code."""
+    ok: bool
+    image_path: str | None
+    stdout: str
+    stderr: str
+    runtime: float
+    error: str | None = None
+
+
+def extract_execute_python(text: str) -> str | None:
+    """Return the code inside the first <execute_python>...</execute_python> block, if any."""
+    match = re.search(r"<execute_python>([\s\S]*?)</execute_python>", text)
+    return match.group(1).strip() if match else None
+
+
+class _Worker:
+    """One warm `chart_worker.py` process and a thread reading its replies."""
+
+    def __init__(self, source: dict, memory_mb: int):
+        env = {**os.environ, "MPLBACKEND": "Agg"}
+        self.proc = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT, json.dumps(source), str(memory_mb)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, env=env,
+        )
+        self.replies: queue.Queue = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self) -> None:
+        for line in self.proc.stdout:
+            self.replies.put(json.loads(line))
+        # EOF: the process exited (crash, CPU limit, or shutdown)
+        self.proc.stdout.close()
+        self.replies.put(None)
+
+    def wait_ready(self, timeout: float) -> None:
+        try:
+            reply = self.replies.get(timeout=timeout)
+        except queue.Empty:
+            self.kill()
+            raise TimeoutError(f"chart worker not ready after {timeout}s")
+        if reply is None:
+            raise RuntimeError(f"chart worker failed to start (exit code {self.proc.wait()})")
+
+    def run(self, job: dict, timeout: float) -> dict | None:
+        """Send a job and wait for its reply; None if the worker died, TimeoutError if it hung."""
+        try:
+            self.proc.stdin.write(json.dumps(job) + "\n")
+            self.proc.stdin.flush()
+            return self.replies.get(timeout=timeout)
+        except (OSError, ValueError):
+            # Broken pipe, or stdin already closed because the worker was killed
+            return None
+        except queue.Empty:
+            raise TimeoutError(f"timed out after {timeout}s")
+
+    def kill(self) -> None:
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def close(self) -> None:
+        if self.proc.poll() is None:
+            self.proc.stdin.close()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.kill()
+
+
+class ChartExecutor:
+    """
+    Runs LLM-generated chart code in a pool of warm worker processes.
+
+    Each worker has pandas and matplotlib imported and the dataset ready as
+    `df` before the first job, so a job only pays for its own code. Pass the
+    prepared DataFrame as `df` to publish it once in shared memory; workers
+    then attach to it instead of each loading `dataset_path`. A job that
+    runs past its wall-clock timeout or CPU limit takes its worker down; the
+    worker is replaced and the notebook process is unaffected.
+
+    Usage:
+        with ChartExecutor(df=df, workers=2) as executor:
+            result = executor.run(code, "chart_v1.png")
+    """
+
+    def __init__(self, dataset_path: str | None = None, workers: int = 2,
+                 loader: str = "data_cache:load_and_prepare_data",
+                 timeout: float = CHART_TIMEOUT,
+                 cpu_seconds: float = CHART_CPU_SECONDS,
+                 memory_mb: int = CHART_MEMORY_MB,
+                 df=None):
+        """
+        Args:
+            dataset_path: File passed to `loader` in each worker (when `df` is not given).
+            workers: Number of worker processes (jobs that can run side by side).
+            loader: "module:function" that loads the dataset into a DataFrame.
+            timeout: Wall-clock seconds a job may take.
+            cpu_seconds: CPU seconds a job may use (POSIX only).
+            memory_mb: Extra address space a job may allocate, in MiB (Linux only).
+            df: Prepared DataFrame to share with the workers (zero-copy for numeric columns).
+        """
+        if df is None and dataset_path is None:
+            raise ValueError("ChartExecutor needs either dataset_path or df")
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+
+        self._shared = None
+        if df is not None:
+            self._shared = SharedFrame(df)
+            fd, self._spec_path = tempfile.mkstemp(suffix=".pkl", prefix="chart_frame_")
+            os.close(fd)
+            self._shared.save_spec(self._spec_path)
+            self._source = {"shared_spec": self._spec_path}
+        else:
+            self._source = {"dataset_path": dataset_path, "loader": loader}
+
+        self._idle: queue.Queue = queue.Queue()
+        started = [_Worker(self._source, memory_mb) for _ in range(workers)]
+        try:
+            # The workers start in parallel; wait for all of them
+            for worker in started:
+                worker.wait_ready(WORKER_STARTUP_TIMEOUT)
+        except Exception:
+            for worker in started:
+                worker.kill()
+            self._release_shared()
+            raise
+        for worker in started:
+            self._idle.put(worker)
+        self._workers = started
+        self._jobs = ThreadPoolExecutor(max_workers=workers)
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.kill()
+        fresh = _Worker(self._source, self.memory_mb)
+        try:
+            fresh.wait_ready(WORKER_STARTUP_TIMEOUT)
+        except Exception:
+            fresh.kill()
+            raise
+        self._workers[self._workers.index(worker)] = fresh
+        return fresh
+
+    def run(self, code: str, image_path: str | None = None,
+            timeout: float | None = None) -> ChartResult:
+        """
+        Execute chart code on a free worker and wait for the result.
+
+        Args:
+            code: Python code using `df` (the body of an <execute_python> block).
+            image_path: File the code is expected to write; checked afterwards.
+            timeout: Wall-clock seconds for this job (defaults to the executor's).
+
+        Returns:
+            ChartResult with image_path (None if it was not written), captured
+            stdout/stderr, runtime in seconds and an error message on failure.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        job = {"code": code, "image_path": image_path, "cpu_seconds": self.cpu_seconds}
+
+        worker = self._idle.get()
+        start = time.perf_counter()
+        try:
+            if worker.proc.poll() is not None:
+                # An earlier replacement failed to start; try again before using the slot
+                worker = self._replace(worker)
+            try:
+                reply = worker.run(job, timeout)
+            except TimeoutError as e:
+                error = str(e)
+            else:
+                if reply is not None:
+                    return ChartResult(**reply)
+                exit_code = worker.proc.wait()
+                if exit_code == -getattr(signal, "SIGXCPU", 0):
+                    error = f"CPU limit of {self.cpu_seconds}s exceeded"
+                else:
+                    error = f"worker exited with code {exit_code}"
+            runtime = time.perf_counter() - start
+            # The worker is hung or dead; swap in a fresh one. If that fails the
+            # dead worker keeps its slot and is replaced when the slot is next used
+            try:
+                worker = self._replace(worker)
+            except Exception as e:
+                worker.kill()
+                error += f" (replacement worker failed to start: {e})"
+            return ChartResult(ok=False, image_path=None, stdout="", stderr="",
+                               runtime=runtime, error=error)
+        finally:
+            self._idle.put(worker)
+
+    def submit(self, code: str, image_path: str | None = None,
+               timeout: float | None = None) -> Future:
+        """Like `run`, but return a Future so several charts can be rendered side by side."""
+        return self._jobs.submit(self.run, code, image_path, timeout)
+
+    def _release_shared(self) -> None:
+        if self._shared is not None:
+            self._shared.close()
+            os.remove(self._spec_path)
+            self._shared = None
+
+    def shutdown(self) -> None:
+        self._jobs.shutdown(wait=True)
+        for worker in self._workers:
+            worker.close()
+        self._release_shared()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
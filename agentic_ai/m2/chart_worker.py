@@ -0,0 +1,138 @@
+"""
+Warm worker process for chart_executor.ChartExecutor.
+
+Started as `python chart_worker.py <source> <memory_mb>`, where source is JSON:
+{"dataset_path": ..., "loader": "module:function"} to load the dataset, or
+{"shared_spec": path} to attach to a DataFrame published with
+shared_frame.SharedFrame. It imports pandas and matplotlib and gets the
+dataset ready once, then reads jobs as JSON lines
+on stdin and answers each with one JSON line on the original stdout. While a
+job runs, anything it prints goes into the job's captured stdout / stderr.
+"""
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+import time
+import traceback
+
+try:
+    import resource  # POSIX only; limits are skipped elsewhere
+except ImportError:
+    resource = None
+
+
+def _virtual_memory_bytes() -> int | None:
+    """Current address-space size (Linux), used as the base for the memory limit."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def _limit_memory(memory_mb: int) -> None:
+    """Allow `memory_mb` MiB of address space on top of what the warm worker already uses."""
+    base = _virtual_memory_bytes()
+    if resource is None or base is None or memory_mb <= 0:
+        return
+    limit = base + memory_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+@contextlib.contextmanager
+def _cpu_limit(cpu_seconds: float):
+    """Kill the worker (SIGXCPU) if this job uses more than `cpu_seconds` of CPU."""
+    if resource is None or not cpu_seconds:
+        yield
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (int(used + cpu_seconds) + 1, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def run_job(job: dict, df, plt) -> dict:
+    image_path = job.get("image_path")
+    before = os.path.getmtime(image_path) if image_path and os.path.exists(image_path) else None
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    error = None
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            with _cpu_limit(job.get("cpu_seconds")):
+                # A shallow copy with copy-on-write: a job's edits to df never
+                # reach the shared data or the next job, and nothing is copied up front
+                exec(job["code"], {"df": df.copy(deep=False), "__name__": "__chart__"})
+        except MemoryError:
+            error = "memory limit exceeded"
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+        finally:
+            plt.close("all")
+    runtime = time.perf_counter() - start
+
+    produced = (image_path is not None and os.path.exists(image_path)
+                and os.path.getmtime(image_path) != before)
+    if error is None and image_path is not None and not produced:
+        error = f"{image_path} was not written"
+    return {
+        "ok": error is None,
+        "image_path": image_path if produced else None,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "runtime": runtime,
+        "error": error,
+    }
+
+
+def load_dataset(source: dict):
+    """Return (df, handle to keep alive) for the worker's data source."""
+    if "shared_spec" in source:
+        import pickle
+        from shared_frame import attach_frame
+        with open(source["shared_spec"], "rb") as f:
+            return attach_frame(pickle.load(f))
+    module_name, func_name = source["loader"].split(":")
+    return getattr(importlib.import_module(module_name), func_name)(source["dataset_path"]), None
+
+
+def main(source: dict, memory_mb: int) -> None:
+    # Keep the protocol on a private copy of stdout; fd 1 now goes to stderr so
+    # stray writes from C extensions cannot corrupt it
+    protocol = os.fdopen(os.dup(1), "w", buffering=1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    sys.path.insert(0, os.getcwd())
+    sys.path.insert(1, os.path.dirname(os.path.abspath(__file__)))
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    if int(pd.__version__.split(".")[0]) < 3:
+        # Always on from pandas 3; needed for the shallow per-job copies above
+        pd.set_option("mode.copy_on_write", True)
+
+    df, _shared = load_dataset(source)
+    _limit_memory(memory_mb)
+    protocol.write(json.dumps({"ready": True}) + "\n")
+
+    for line in sys.stdin:
+        result = run_job(json.loads(line), df, plt)
+        protocol.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main(json.loads(sys.argv[1]), int(sys.argv[2]))
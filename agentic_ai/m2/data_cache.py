@@ -0,0 +1,119 @@
+"""
+On-disk columnar cache for `utils.load_and_prepare_data`.
+
+The first load of a CSV parses it and derives quarter / month / year as
+usual, then writes the prepared frame as Parquet next to a hash of the
+source file. Later loads of the same bytes read the typed columns back
+instead of parsing and deriving again. Editing the CSV changes the hash,
+so a stale cache is never used.
+
+Parquet needs pyarrow; without it the cache falls back to pandas' pickle
+format, which also keeps the column dtypes.
+"""
+import hashlib
+import os
+
+import pandas as pd
+
+import utils  # local library  from deeplearing.ai
+
+# Where cached frames are kept; set M2_DATA_CACHE=0 to always parse the CSV
+DATA_CACHE_DIR = os.getenv("M2_DATA_CACHE_DIR", ".data_cache")
+DATA_CACHE_ENABLED = os.getenv("M2_DATA_CACHE", "1") != "0"
+# Bump when the preparation steps change so old cache files are not reused
+CACHE_VERSION = "1"
+
+
+def _parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of the file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path(dataset_path: str, cache_dir: str = DATA_CACHE_DIR) -> str:
+    """Cache file for the current contents of `dataset_path`."""
+    stem = os.path.splitext(os.path.basename(dataset_path))[0]
+    key = hashlib.sha256(f"{CACHE_VERSION}:{file_digest(dataset_path)}".encode()).hexdigest()[:16]
+    ext = ".parquet" if _parquet_available() else ".pkl"
+    return os.path.join(cache_dir, f"{stem}-{key}{ext}")
+
+
+def _remove_stale(path: str) -> None:
+    """Drop cache files of older versions of the same dataset."""
+    cache_dir = os.path.dirname(path)
+    stem = os.path.basename(path).rsplit("-", 1)[0]
+    for name in os.listdir(cache_dir):
+        other = os.path.join(cache_dir, name)
+        if other != path and not name.endswith(".tmp") and name.rsplit("-", 1)[0] == stem:
+            os.remove(other)
+
+
+def _read(path: str) -> pd.DataFrame:
+    return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_pickle(path)
+
+
+def _write(df: pd.DataFrame, path: str) -> None:
+    """Write the cache file atomically and drop older versions of it."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write to a temporary name first so a crash never leaves a half-written cache
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        if path.endswith(".parquet"):
+            df.to_parquet(tmp_path)
+        else:
+            df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _remove_stale(path)
+
+
+def load_and_prepare_data(dataset_path: str, cache_dir: str = DATA_CACHE_DIR,
+                          use_cache: bool = DATA_CACHE_ENABLED) -> pd.DataFrame:
+    """
+    Drop-in for `utils.load_and_prepare_data` that reuses a cached copy.
+
+    A frame Parquet cannot store (e.g. an object column mixing numbers and
+    strings) is cached as a pickle instead; if caching fails altogether the
+    frame is still returned, only without the speed-up next time.
+
+    Args:
+        dataset_path: CSV file to load.
+        cache_dir: Directory holding the cached frames.
+        use_cache: False to parse the CSV every time (nothing is written).
+
+    Returns:
+        The prepared DataFrame, including the derived date columns.
+    """
+    if not use_cache:
+        return utils.load_and_prepare_data(dataset_path)
+
+    path = cache_path(dataset_path, cache_dir)
+    pickle_path = os.path.splitext(path)[0] + ".pkl"
+    for candidate in dict.fromkeys((path, pickle_path)):
+        if os.path.exists(candidate):
+            try:
+                return _read(candidate)
+            except Exception as e:
+                print(f"Ignoring unreadable cache {candidate}: {e}")
+
+    df = utils.load_and_prepare_data(dataset_path)
+    for candidate in dict.fromkeys((path, pickle_path)):
+        try:
+            _write(df, candidate)
+            break
+        except Exception as e:
+            print(f"Could not cache {dataset_path} as {candidate}: {e}")
+    return df
@@ -5,15 +5,39 @@
 
 import re 
 import json 
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 import utils  # local library  from deeplearing.ai
+import data_cache
+from chart_executor import ChartExecutor, extract_execute_python
+from reflection import DONE_MARKER, normalize_whitespace, reflect_until_converged
 
 
-# Use this utils.py function to load the data into a dataframe
-df = utils.load_and_prepare_data('coffee_sales.csv')
+# Load the data into a dataframe with utils.load_and_prepare_data; the prepared
+# frame is cached as Parquet, so later runs skip parsing the CSV
+df = data_cache.load_and_prepare_data('coffee_sales.csv')
 
 # Grab a random sample to display
 utils.print_html(df.sample(n=5), title="Random Sample of Coffee Sales Data")
 
+# Generated code runs in warm worker processes so a slow or broken script
+# cannot hang this process; the prepared df is shared with them, not reloaded
+executor = ChartExecutor(df=df, workers=2)
+# Stop the workers and remove the shared data when the script or kernel exits
+atexit.register(executor.shutdown)
+
+
+def run_chart_code(executor: ChartExecutor, llm_output: str, out_path: str):
+    """Run the <execute_python> block of an LLM response on the executor and report failures."""
+    code = extract_execute_python(llm_output)
+    if code is None:
+        utils.print_html("No <execute_python> block found", title="Chart code not executed")
+        return None
+    result = executor.run(code, out_path)
+    if not result.ok:
+        utils.print_html(f"{result.error}\n\n{result.stderr}", title=f"Chart code failed ({result.runtime:.1f}s)")
+    return result
+
 ########## 
 def generate_chart_code(instruction:str,model:str,out_path_v1:str) -> str: 
     """Generate Python code to make a plot with matplotlib using tag-based wrapping."""
@@ -70,13 +94,11 @@ utils.print_html(code_v1, title="LLM output with first draft code")
 
 
 #################
-# Get the code within the <execute_python> tags
-match = re.search(r"<execute_python>([\s\S]*?)</execute_python>", code_v1)
-if match:
-    initial_code = match.group(1).strip()
+# Get the code within the <execute_python> tags and run it in a worker
+initial_code = extract_execute_python(code_v1)
+if initial_code:
     utils.print_html(initial_code, title="Extracted Code to Execute")
-    exec_globals = {"df": df}
-    exec(initial_code, exec_globals)
+    run_chart_code(executor, code_v1, "chart_v1.png")
 
 # If code run successfully, the file chart_v1.png should have been generated
 utils.print_html(
@@ -89,6 +111,16 @@ utils.print_html(
 ## step 3; reflect on the output 
 
 
+def image_call(model_name: str, prompt: str, media_type: str, b64: str) -> str:
+    """Send a prompt plus one image to an OpenAI or Anthropic (Claude) model and return its text."""
+    # In case the name is "Claude" or "Anthropic", use the safe helper
+    lower = model_name.lower()
+    if "claude" in lower or "anthropic" in lower:
+        # ✅ Use the  safe helper that joins all text blocks and adds a system prompt
+        return utils.image_anthropic_call(model_name, prompt, media_type, b64)
+    return utils.image_openai_call(model_name, prompt, media_type, b64)
+
+
 def reflect_on_image_and_regenerate(
     chart_path: str,
     instruction: str,
@@ -116,6 +148,8 @@ def reflect_on_image_and_regenerate(
     OUTPUT FORMAT (STRICT):
     1) First line: a valid JSON object with ONLY the "feedback" field.
     Example: {{"feedback": "The legend is unclear and the axis labels overlap."}}
+    If the chart already fully satisfies the instruction, start the feedback with
+    {DONE_MARKER} and return the original code unchanged.
 
     2) After a newline, output ONLY the refined Python code wrapped in:
     <execute_python>
@@ -148,13 +182,7 @@ def reflect_on_image_and_regenerate(
     """
 
 
-    # In case the name is "Claude" or "Anthropic", use the safe helper
-    lower = model_name.lower()
-    if "claude" in lower or "anthropic" in lower:
-        # ✅ Use the  safe helper that joins all text blocks and adds a system prompt
-        content = utils.image_anthropic_call(model_name, prompt, media_type, b64)
-    else:
-        content = utils.image_openai_call(model_name, prompt, media_type, b64)
+    content = image_call(model_name, prompt, media_type, b64)
 
     # --- Parse ONLY the first JSON line (feedback) ---
     lines = content.strip().splitlines()
@@ -182,6 +210,54 @@ def reflect_on_image_and_regenerate(
     return feedback, refined_code
 
 
+def fix_failed_chart_code(
+    code: str,
+    error: str,
+    instruction: str,
+    model_name: str,
+    out_path: str,
+) -> str:
+    """
+    Text-only refinement for chart code that failed to run (there is no image to critique).
+    Returns the fixed code wrapped in <execute_python> tags.
+    """
+    prompt = f"""
+    You are a data visualization expert.
+    The chart code below failed when it was run. Fix it so it runs and satisfies the instruction.
+
+    Code:
+    {code}
+
+    Error:
+    {error}
+
+    HARD CONSTRAINTS:
+    - Return ONLY the fixed Python code wrapped in <execute_python> tags.
+    - Use pandas/matplotlib only (no seaborn).
+    - Assume df already exists; do not read from files.
+    - Save to '{out_path}' with dpi=300.
+    - Always call plt.close() at the end (no plt.show()).
+    - Include all necessary import statements.
+
+    Schema (columns available in df):
+    - date (M/D/YY)
+    - time (HH:MM)
+    - cash_type (card or cash)
+    - card (string)
+    - price (number)
+    - coffee_name (string)
+    - quarter (1-4)
+    - month (1-12)
+    - year (YYYY)
+
+    Instruction:
+    {instruction}
+    """
+
+    content = utils.get_response(model_name, prompt)
+    return utils.ensure_execute_python_tags(extract_execute_python(content) or "")
+
+
 
 # Generate feedback alongside reflected code
 feedback, code_v2 = reflect_on_image_and_regenerate(
@@ -197,12 +273,7 @@ utils.print_html(code_v2, title="Regenerated Code Output (V2)")
 
 
 ## run the regenerated chart 
-# Get the code within the <execute_python> tags
-match = re.search(r"<execute_python>([\s\S]*?)</execute_python>", code_v2)
-if match:
-    reflected_code = match.group(1).strip()
-    exec_globals = {"df": df}
-    exec(reflected_code, exec_globals)
+run_chart_code(executor, code_v2, "chart_v2.png")
 
 # If code run successfully, the file chart_v2.png should have been generated
 utils.print_html(
@@ -212,6 +283,99 @@ utils.print_html(
 )
 
 
+############################
+## best-of-N: several candidates in parallel instead of serial reflection rounds
+
+
+def score_chart(chart_path: str, instruction: str, model_name: str) -> tuple[float | None, str]:
+    """
+    Rate a rendered chart against the instruction with a vision model.
+    Returns (score from 0 to 10, feedback); the score is None if the reply could not be parsed.
+    """
+    media_type, b64 = utils.encode_image_b64(chart_path)
+
+    prompt = f"""
+    You are a data visualization expert.
+    Rate the attached chart on how well it answers the instruction: correct data,
+    appropriate chart type, readable labels, title and legend.
+
+    OUTPUT FORMAT (STRICT): a single line with a valid JSON object, nothing else.
+    Example: {{"score": 7, "feedback": "Correct comparison, but the legend hides the bars."}}
+
+    "score" is a number from 0 (useless) to 10 (excellent).
+
+    Instruction:
+    {instruction}
+    """
+
+    content = image_call(model_name, prompt, media_type, b64)
+    m_json = re.search(r"\{.*?\}", content, flags=re.DOTALL)
+    try:
+        obj = json.loads(m_json.group(0)) if m_json else {}
+        score = float(obj["score"])
+    except (ValueError, KeyError, TypeError) as e:
+        return None, f"Failed to parse score: {e}"
+    return score, str(obj.get("feedback", "")).strip()
+
+
+def _run_candidate(index: int, model: str, instruction: str, scoring_model: str,
+                   executor: ChartExecutor, image_basename: str) -> dict:
+    """Generate, execute and score one candidate chart; failures are recorded in its feedback."""
+    out_path = f"{image_basename}_c{index}.png"
+    candidate = {"model": model, "chart": out_path, "code": None, "run": None,
+                 "score": None, "feedback": ""}
+    try:
+        candidate["code"] = generate_chart_code(instruction=instruction, model=model, out_path_v1=out_path)
+
+        code = extract_execute_python(candidate["code"])
+        if code is None:
+            candidate["feedback"] = "No <execute_python> block found"
+            return candidate
+        candidate["run"] = executor.run(code, out_path)
+        if not candidate["run"].ok:
+            candidate["feedback"] = candidate["run"].error
+            return candidate
+
+        candidate["score"], candidate["feedback"] = score_chart(out_path, instruction, scoring_model)
+    except Exception as e:
+        # An API error or rate limit on one candidate must not abort the others
+        candidate["score"] = None
+        candidate["feedback"] = f"{type(e).__name__}: {e}"
+    return candidate
+
+
+def generate_best_chart(
+    instruction: str,
+    candidate_models: list[str],
+    scoring_model: str,
+    executor: ChartExecutor,
+    image_basename: str = "chart",
+) -> dict:
+    """
+    Best-of-N chart generation.
+
+    Each entry of `candidate_models` produces one candidate (list a model twice
+    for two independent samples). Every candidate is generated, executed on
+    `executor` and scored by `scoring_model` in its own thread, so the wall-clock
+    cost is about one generate → run → score round, not N of them. Chart runs
+    beyond the executor's worker count wait for a free worker.
+
+    Returns a dict with all candidates (model, code, chart, run, score, feedback)
+    in input order and "best", the highest-scoring candidate (None if none rendered).
+    """
+    with ThreadPoolExecutor(max_workers=len(candidate_models)) as pool:
+        futures = [
+            pool.submit(_run_candidate, i, model, instruction, scoring_model, executor, image_basename)
+            for i, model in enumerate(candidate_models, start=1)
+        ]
+        candidates = [f.result() for f in futures]
+
+    scored = [c for c in candidates if c["score"] is not None]
+    # Ties go to the candidate listed first
+    best = max(scored, key=lambda c: c["score"]) if scored else None
+    return {"candidates": candidates, "best": best}
+
+
 ############################
 def run_workflow(
     dataset_path: str,
@@ -219,6 +383,11 @@ def run_workflow(
     generation_model: str,
     reflection_model: str,   
     image_basename: str = "chart",
+    executor: ChartExecutor | None = None,
+    candidate_models: list[str] | None = None,
+    max_iterations: int = 3,
+    scoring_model: str | None = None,
+    target_score: float | None = None,
 ):
     """
     End-to-end pipeline:
@@ -227,61 +396,137 @@ def run_workflow(
       3) execute V1 → produce chart_v1.png
       4) reflect on V1 (image + original code) → feedback + refined code
       5) execute V2 → produce chart_v2.png
+      6) repeat 4-5 on the newest version, up to `max_iterations` refinements
+
+    The loop stops early when the reflection reports the chart as done, when
+    the refined code is unchanged, or, with `scoring_model`, when the score
+    stops improving or reaches `target_score` (see reflection.reflect_until_converged).
+
+    With `candidate_models`, steps 2-6 are replaced by best-of-N: one candidate
+    per listed model is generated, executed and scored by `reflection_model`
+    in parallel, and the best one is kept (see `generate_best_chart`).
+
+    Chart code runs on `executor` (a ChartExecutor over the same dataset);
+    if none is given, an executor sharing this run's df is started.
 
     Returns a dict with all artifacts (codes, feedback, image paths).
     """
     # 0) Load dataset; utils handles parsing and feature derivations (e.g., year/quarter)
-    df = utils.load_and_prepare_data(dataset_path)
+    df = data_cache.load_and_prepare_data(dataset_path)
     utils.print_html(df.sample(n=5), title="Random Sample of Dataset")
-
-    # Paths to store charts
-    out_v1 = f"{image_basename}_v1.png"
-    out_v2 = f"{image_basename}_v2.png"
+    own_executor = executor is None
+    if own_executor:
+        executor = ChartExecutor(df=df, workers=len(candidate_models) if candidate_models else 1)
+
+    if candidate_models:
+        utils.print_html(f"Generating, executing and scoring {len(candidate_models)} candidates in parallel… 📈")
+        try:
+            result = generate_best_chart(
+                instruction=user_instructions,
+                candidate_models=candidate_models,
+                scoring_model=reflection_model,
+                executor=executor,
+                image_basename=image_basename,
+            )
+        finally:
+            if own_executor:
+                executor.shutdown()
+        for c in result["candidates"]:
+            utils.print_html(f"{c['model']}: score {c['score']} — {c['feedback']}", title=f"Candidate {c['chart']}")
+        best = result["best"]
+        if best is not None:
+            utils.print_html(best["chart"], is_image=True, title=f"Best Chart ({best['model']}, score {best['score']})")
+        return {**result, "chart_best": best["chart"] if best else None}
+
+    def chart_path(version: int) -> str:
+        return f"{image_basename}_v{version}.png"
+
+    def execute(code: str, version: int):
+        # Extract the <execute_python> block and run it in a worker process
+        utils.print_html(f"Executing chart code (V{version})… 💻")
+        return run_chart_code(executor, code, chart_path(version))
+
+    def show(step):
+        if step.ok:
+            utils.print_html(chart_path(step.version), is_image=True,
+                             title=f"Chart (V{step.version})" + (f", score {step.score}" if step.score is not None else ""))
+
+    def reflect(step):
+        if not step.ok:
+            # No chart to look at (and a file on disk may be stale); fix the code from the error
+            result = step.output
+            error = "No <execute_python> block found" if result is None else f"{result.error}\n{result.stderr}"
+            utils.print_html(f"V{step.version} failed; asking for a fix… 🛠️")
+            code = fix_failed_chart_code(
+                code=step.artifact,
+                error=error,
+                instruction=user_instructions,
+                model_name=reflection_model,
+                out_path=chart_path(step.version + 1),
+            )
+            utils.print_html(code, title=f"LLM output with fixed code (V{step.version + 1})")
+            return f"V{step.version} failed: {error.strip()}", code
+
+        # Reflect on the chart (image + code) to get feedback and refined code
+        utils.print_html(f"Reflecting on V{step.version} (image + code) and generating improvements… 🔁")
+        feedback, code = reflect_on_image_and_regenerate(
+            chart_path=chart_path(step.version),
+            instruction=user_instructions,
+            model_name=reflection_model,
+            out_path_v2=chart_path(step.version + 1),
+            code_v1=step.artifact,  # pass the current code for context
+        )
+        utils.print_html(feedback, title=f"Reflection feedback on V{step.version}")
+        utils.print_html(code, title=f"LLM output with revised code (V{step.version + 1})")
+        return feedback, code
+
+    def evaluate(step):
+        return score_chart(chart_path(step.version), user_instructions, scoring_model)[0]
+
+    def normalize(code: str) -> str:
+        # Versions differ in the file they save to; ignore that when comparing
+        body = extract_execute_python(code) or code
+        return normalize_whitespace(re.sub(rf"{re.escape(image_basename)}_v\d+\.png", "", body))
 
     # 1) Generate code (V1)
     utils.print_html("Step 1: Generating chart code (V1)… 📈")
     code_v1 = generate_chart_code(
         instruction=user_instructions,
         model=generation_model,
-        out_path_v1=out_v1,
+        out_path_v1=chart_path(1),
     )
     utils.print_html(code_v1, title="LLM output with first draft code (V1)")
 
-    # 2) Execute V1 (hard-coded: extract <execute_python> block and run immediately)
-    utils.print_html("Step 2: Executing chart code (V1)… 💻")
-    match = re.search(r"<execute_python>([\s\S]*?)</execute_python>", code_v1)
-    if match:
-        initial_code = match.group(1).strip()
-        exec_globals = {"df": df}
-        exec(initial_code, exec_globals)
-    utils.print_html(out_v1, is_image=True, title="Generated Chart (V1)")
-
-    # 3) Reflect on V1 (image + original code) to get feedback and refined code (V2)
-    utils.print_html("Step 3: Reflecting on V1 (image + code) and generating improvements… 🔁")
-    feedback, code_v2 = reflect_on_image_and_regenerate(
-        chart_path=out_v1,
-        instruction=user_instructions,
-        model_name=reflection_model,
-        out_path_v2=out_v2,
-        code_v1=code_v1,  # pass original code for context
-    )
-    utils.print_html(feedback, title="Reflection feedback on V1")
-    utils.print_html(code_v2, title="LLM output with revised code (V2)")
-
-    # 4) Execute V2 (hard-coded: extract <execute_python> block and run immediately)
-    utils.print_html("Step 4: Executing refined chart code (V2)… 🖼️")
-    match = re.search(r"<execute_python>([\s\S]*?)</execute_python>", code_v2)
-    if match:
-        reflected_code = match.group(1).strip()
-        exec_globals = {"df": df}
-        exec(reflected_code, exec_globals)
-    utils.print_html(out_v2, is_image=True, title="Regenerated Chart (V2)")
+    # 2) Execute, reflect and refine until the chart stops changing or improving
+    try:
+        result = reflect_until_converged(
+            initial=code_v1,
+            execute=execute,
+            reflect=reflect,
+            succeeded=lambda result: result is not None and result.ok,
+            max_iterations=max_iterations,
+            evaluate=evaluate if scoring_model else None,
+            normalize=normalize,
+            target_score=target_score,
+            on_step=show,
+        )
+    finally:
+        if own_executor:
+            executor.shutdown()
+    first, kept = result.steps[0], result.best
+    utils.print_html(f"Stopped after {len(result.steps)} version(s): {result.stop_reason}; keeping V{kept.version}",
+                     title="Reflection loop")
 
     return {
-        "code_v1": code_v1,
-        "chart_v1": out_v1,
-        "feedback": feedback,
-        "code_v2": code_v2,
-        "chart_v2": out_v2,
+        "code_v1": first.artifact,
+        "chart_v1": chart_path(1),
+        "run_v1": first.output,
+        "feedback": first.feedback,
+        # The version kept: the best scored, else the last that rendered; V1 itself if reflection changed nothing
+        "code_v2": kept.artifact,
+        "chart_v2": chart_path(kept.version),
+        "run_v2": kept.output,
+        "steps": result.steps,
+        "stop_reason": result.stop_reason,
     }
 
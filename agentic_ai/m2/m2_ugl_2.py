@@ -5,6 +5,7 @@ import json
 import utils
 import pandas as pd
 from dotenv import load_dotenv
+from reflection import DONE_MARKER, normalize_whitespace, reflect_until_converged
 
 _ = load_dotenv()
 
@@ -189,7 +190,8 @@ def refine_sql_external_feedback(
 
     Step 1: Briefly evaluate if the SQL output answers the user's question.
     Step 2: If the SQL could be improved, provide a refined SQL query.
-    If the original SQL is already correct, return it unchanged.
+    If the original SQL is already correct, return it unchanged and start
+    the feedback with {DONE_MARKER}.
 
     Return a strict JSON object with two fields:
     - "feedback": brief evaluation and suggestions
@@ -249,11 +251,17 @@ utils.print_html(df_sql_V2, title="SQL Output of V2 (with External Feedback) - 
 
 ########################
 
+def normalize_sql(sql: str) -> str:
+    """Compare queries ignoring whitespace and a trailing semicolon."""
+    return normalize_whitespace(sql).rstrip("; ")
+
+
 def run_sql_workflow(
     db_path: str,
     question: str,
     model_generation: str = "openai:gpt-4.1",
     model_evaluation: str = "openai:gpt-4.1",
+    max_iterations: int = 3,
 ):
     """
     End-to-end workflow to generate, execute, evaluate, and refine SQL queries.
@@ -263,7 +271,13 @@ def run_sql_workflow(
       2) Generate SQL (V1)
       3) Execute V1 → show output
       4) Reflect on V1 with execution feedback → propose refined SQL (V2)
-      5) Execute V2 → show final answer
+      5) Execute V2 → show output
+      6) Repeat 4-5 on the newest query, up to `max_iterations` refinements
+
+    The loop stops early when the reviewer reports the query as correct or
+    returns it unchanged, so an easy question costs one reflection call.
+
+    Returns a dict with the final SQL and output, the stop reason and every step.
     """
 
     # 1) Schema
@@ -280,36 +294,52 @@ def run_sql_workflow(
         title="🧠 Step 2 — Generate SQL (V1)"
     )
 
-    # 3) Execute V1
-    df_v1 = utils.execute_sql(sql_v1, db_path)
-    utils.print_html(
-        df_v1,
-        title="🧪 Step 3 — Execute V1 (SQL Output)"
-    )
-
-    # 4) Reflect on V1 with execution feedback → refine to V2
-    feedback, sql_v2 = refine_sql_external_feedback(
-        question=question,
-        sql_query=sql_v1,
-        df_feedback=df_v1,          # external feedback: real output of V1
-        schema=schema,
-        model=model_evaluation,
-    )
-    utils.print_html(
-        feedback,
-        title="🧭 Step 4 — Reflect on V1 (Feedback)"
+    # 3, 5) Execute each version
+    def execute(sql: str, version: int) -> pd.DataFrame:
+        df = utils.execute_sql(sql, db_path)
+        utils.print_html(
+            df,
+            title=f"🧪 Execute V{version} (SQL Output)"
+        )
+        return df
+
+    # 4) Reflect on the newest version with execution feedback → refine
+    def reflect(step):
+        feedback, sql = refine_sql_external_feedback(
+            question=question,
+            sql_query=step.artifact,
+            df_feedback=step.output,    # external feedback: real output of this version
+            schema=schema,
+            model=model_evaluation,
+        )
+        utils.print_html(
+            feedback,
+            title=f"🧭 Reflect on V{step.version} (Feedback)"
+        )
+        utils.print_html(
+            sql,
+            title=f"🔁 Refined SQL (V{step.version + 1})"
+        )
+        return feedback, sql
+
+    result = reflect_until_converged(
+        initial=sql_v1,
+        execute=execute,
+        reflect=reflect,
+        max_iterations=max_iterations,
+        normalize=normalize_sql,
     )
+    final = result.final
     utils.print_html(
-        sql_v2,
-        title="🔁 Step 4 — Refined SQL (V2)"
-    )
-
-    # 5) Execute V2
-    df_v2 = utils.execute_sql(sql_v2, db_path)
-    utils.print_html(
-        df_v2,
-        title="✅ Step 5 — Execute V2 (Final Answer)"
+        final.output,
+        title=f"✅ Final Answer (V{final.version}, stopped: {result.stop_reason})"
     )
+    return {
+        "sql": final.artifact,
+        "df": final.output,
+        "stop_reason": result.stop_reason,
+        "steps": result.steps,
+    }
 
 ##
 run_sql_workflow(
@@ -0,0 +1,147 @@
+"""
+Reflection loop shared by the M2 workflows (chart code in m2_ugl_1, SQL in m2_ugl_2).
+
+An artifact (code, a query) is executed, reflected on and refined, repeatedly,
+until one of these happens:
+
+- success:        the reflection feedback says no change is needed
+                  (it contains DONE_MARKER), or the score reaches `target_score`
+- unchanged:      the refined artifact is the same as the current one
+- plateau:        the evaluator score stopped improving for `patience` rounds
+- max_iterations: `max_iterations` refinements were made
+
+Stopping on success or unchanged skips executing (and reflecting on) a
+version that would not differ from the last one.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+# Reflection prompts ask the model to start its feedback with this when the
+# artifact already does what was asked
+DONE_MARKER = "NO_CHANGES_NEEDED"
+
+
+def feedback_reports_success(feedback: str) -> bool:
+    """True if the reflection feedback contains DONE_MARKER."""
+    return DONE_MARKER in (feedback or "").upper()
+
+
+def normalize_whitespace(artifact: str) -> str:
+    """Compare artifacts ignoring whitespace differences."""
+    return " ".join(str(artifact).split())
+
+
+@dataclass
+class ReflectionStep:
+    """One version of the artifact, its execution output and what the reflection said about it."""
+    version: int
+    artifact: str
+    output: Any
+    score: float | None = None
+    feedback: str | None = None
+    ok: bool = True
+
+
+@dataclass
+class ReflectionResult:
+    """Every executed version of the artifact and why the loop stopped."""
+    steps: list[ReflectionStep] = field(default_factory=list)
+    stop_reason: str = ""
+
+    @property
+    def final(self) -> ReflectionStep:
+        """The last executed version."""
+        return self.steps[-1]
+
+    @property
+    def best(self) -> ReflectionStep:
+        """
+        The highest-scoring version (earliest on ties); if nothing was scored,
+        the last version that ran successfully, else the last one.
+        """
+        scored = [s for s in self.steps if s.score is not None]
+        if scored:
+            return max(scored, key=lambda s: s.score)
+        succeeded = [s for s in self.steps if s.ok]
+        return succeeded[-1] if succeeded else self.final
+
+
+def reflect_until_converged(
+    initial: str,
+    execute: Callable[[str, int], Any],
+    reflect: Callable[[ReflectionStep], tuple[str, str]],
+    succeeded: Callable[[Any], bool] = lambda output: True,
+    max_iterations: int = 3,
+    evaluate: Callable[[ReflectionStep], float | None] | None = None,
+    normalize: Callable[[str], str] = normalize_whitespace,
+    is_done: Callable[[str], bool] = feedback_reports_success,
+    target_score: float | None = None,
+    min_improvement: float = 0.0,
+    patience: int = 1,
+    on_step: Callable[[ReflectionStep], None] | None = None,
+) -> ReflectionResult:
+    """
+    Run the execute → reflect → refine loop with early stopping.
+
+    Args:
+        initial: First version of the artifact (V1).
+        execute: execute(artifact, version) → output, e.g. a ChartResult or DataFrame.
+        reflect: reflect(step) → (feedback, refined_artifact) for the latest step;
+            `step.ok` tells it whether that version ran, so it can ask for a fix instead.
+        succeeded: succeeded(output) → whether a version ran successfully.
+        max_iterations: Most refinements to make (1 = the classic V1 → V2).
+        evaluate: Optional evaluate(step) → score (higher is better) or None.
+        normalize: Maps an artifact to the form compared for the "unchanged" check.
+        is_done: Whether reflection feedback reports the artifact as already correct.
+        target_score: Stop as soon as a version scores at least this much.
+        min_improvement: Score gain over the best so far that counts as progress.
+        patience: Rounds without progress tolerated before stopping on a plateau.
+        on_step: Called with each step once it is executed and scored, e.g. to display it.
+
+    Returns:
+        ReflectionResult with every executed step, in order, and the stop reason.
+    """
+    result = ReflectionResult()
+
+    def run(artifact: str, version: int) -> ReflectionStep:
+        output = execute(artifact, version)
+        step = ReflectionStep(version=version, artifact=artifact, output=output, ok=succeeded(output))
+        if evaluate is not None and step.ok:
+            step.score = evaluate(step)
+        result.steps.append(step)
+        if on_step is not None:
+            on_step(step)
+        return step
+
+    def reached_target(step: ReflectionStep) -> bool:
+        return target_score is not None and step.score is not None and step.score >= target_score
+
+    step = run(initial, 1)
+    best_score, stale = step.score, 0
+    for _ in range(max_iterations):
+        if reached_target(step):
+            result.stop_reason = "success"
+            return result
+
+        step.feedback, refined = reflect(step)
+        if is_done(step.feedback):
+            result.stop_reason = "success"
+            return result
+        if normalize(refined) == normalize(step.artifact):
+            result.stop_reason = "unchanged"
+            return result
+
+        step = run(refined, step.version + 1)
+        if step.score is None:
+            continue
+        if best_score is not None and step.score - best_score <= min_improvement:
+            stale += 1
+            if stale >= patience:
+                result.stop_reason = "plateau"
+                return result
+        else:
+            stale = 0
+        best_score = step.score if best_score is None else max(best_score, step.score)
+
+    result.stop_reason = "success" if reached_target(step) else "max_iterations"
+    return result
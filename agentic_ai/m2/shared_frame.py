@@ -0,0 +1,135 @@
+"""
+Publish a prepared DataFrame once in shared memory so chart workers can attach
+to it instead of re-reading and re-deriving the CSV.
+
+Numeric, boolean and datetime columns are stored as raw numpy buffers and
+attached zero-copy (read-only). Other columns (strings, mixed objects,
+categoricals) are stored as integer codes plus their distinct values, so a
+worker rebuilds them from the codes without parsing anything.
+"""
+from multiprocessing import shared_memory
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# Buffer offsets are aligned for vectorised reads
+ALIGNMENT = 64
+
+
+def _is_raw(series: pd.Series) -> bool:
+    """True if the column's values can be shared as a plain numpy buffer."""
+    return isinstance(series.dtype, np.dtype) and series.dtype.kind in "biufcmM"
+
+
+class SharedFrame:
+    """
+    A DataFrame published in one shared-memory block by the process that owns it.
+
+    `spec` is a small picklable description (block name, column layout, distinct
+    values of encoded columns) that workers pass to `attach_frame`. Call
+    `close()` when no worker needs the data any more.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        index = df.index
+        frame = df if isinstance(index, pd.RangeIndex) else df.reset_index()
+
+        columns, arrays, offset = [], [], 0
+        for name in frame.columns:
+            series = frame[name]
+            if _is_raw(series):
+                values = np.ascontiguousarray(series.to_numpy())
+                column = {"name": name, "kind": "raw", "dtype": values.dtype.str}
+            else:
+                if isinstance(series.dtype, pd.CategoricalDtype):
+                    values, uniques = series.cat.codes.to_numpy(), series.cat.categories
+                    kind = "category"
+                else:
+                    values, uniques = pd.factorize(series, use_na_sentinel=True)
+                    kind = "codes"
+                values = np.ascontiguousarray(values, dtype=np.int32)
+                missing = series[series.isna()]
+                column = {"name": name, "kind": kind, "dtype": values.dtype.str,
+                          "uniques": uniques, "source_dtype": series.dtype,
+                          # Restore missing values as they were (None vs NaN in object columns)
+                          "na_value": missing.iloc[0] if len(missing) else None}
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            column.update(offset=offset, length=len(values))
+            columns.append(column)
+            arrays.append(values)
+            offset += values.nbytes
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for column, values in zip(columns, arrays):
+            target = np.ndarray(values.shape, dtype=values.dtype, buffer=self.shm.buf,
+                                offset=column["offset"])
+            target[:] = values
+
+        self.spec = {
+            "shm_name": self.shm.name,
+            "columns": columns,
+            "range_index": (index.start, index.stop, index.step) if isinstance(index, pd.RangeIndex) else None,
+            "index_names": list(index.names),
+        }
+        self.nbytes = offset
+
+    def save_spec(self, path: str) -> None:
+        """Write the spec to a file a worker can read at startup."""
+        with open(path, "wb") as f:
+            pickle.dump(self.spec, f)
+
+    def close(self) -> None:
+        """Release and remove the shared block; attached workers keep their mapping until they exit."""
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _open_existing(name: str) -> shared_memory.SharedMemory:
+    """Attach without registering the block for cleanup in this process (the owner removes it)."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def attach_frame(spec: dict) -> tuple[pd.DataFrame, shared_memory.SharedMemory]:
+    """
+    Build a DataFrame over a published SharedFrame.
+
+    Returns the frame and the shared-memory handle, which must be kept alive
+    as long as the frame is used. Raw columns are read-only views of the block.
+    """
+    shm = _open_existing(spec["shm_name"])
+    data = {}
+    for column in spec["columns"]:
+        values = np.ndarray((column["length"],), dtype=np.dtype(column["dtype"]),
+                            buffer=shm.buf, offset=column["offset"])
+        values.flags.writeable = False
+        if column["kind"] == "raw":
+            data[column["name"]] = values
+        elif column["kind"] == "category":
+            data[column["name"]] = pd.Categorical.from_codes(values, dtype=column["source_dtype"])
+        else:
+            # Code -1 marks a missing value, which is the last entry of the lookup
+            lookup = np.empty(len(column["uniques"]) + 1, dtype=object)
+            lookup[:-1] = np.asarray(column["uniques"], dtype=object)
+            lookup[-1] = column["na_value"]
+            restored = lookup[values]
+            dtype = column["source_dtype"]
+            data[column["name"]] = restored if dtype == object else pd.array(restored, dtype=dtype)
+
+    df = pd.DataFrame(data, copy=False)
+    if spec["range_index"] is not None:
+        df.index = pd.RangeIndex(*spec["range_index"], name=spec["index_names"][0])
+    else:
+        index_columns = [c["name"] for c in spec["columns"][:len(spec["index_names"])]]
+        df = df.set_index(index_columns)
+        df.index.names = spec["index_names"]
+    return df, shm
@@ -0,0 +1,119 @@
+"""
+Where the display helpers (`utils.print_html`, `utils.pretty_display`,
+`display_functions.pretty_print_chat_completion`) send their output.
+
+- html:     styled cards in a Jupyter notebook (the default)
+- terminal: plain text on stdout
+- jsonl:    one JSON object per call appended to a log file
+- null:     nothing at all
+
+Pick one with the DISPLAY_BACKEND env var or `set_display("terminal")`.
+Helpers check `enabled` and `html` before formatting anything, so HTML,
+indented JSON and base64 images are only built for the html backend, and
+the null backend costs nothing.
+"""
+from typing import Any
+import json
+import os
+import sys
+import time
+
+# Characters of each item shown by the text backends
+TEXT_PREVIEW_CHARS = int(os.getenv("DISPLAY_TEXT_PREVIEW_CHARS", "2000"))
+# Rows of a DataFrame shown by the text backends
+TEXT_PREVIEW_ROWS = int(os.getenv("DISPLAY_TEXT_PREVIEW_ROWS", "10"))
+
+
+def to_text(content: Any, max_chars: int = TEXT_PREVIEW_CHARS) -> str:
+    """Compact, truncated plain-text form of a displayed value."""
+    if hasattr(content, "head") and hasattr(content, "to_string"):
+        # pandas DataFrame / Series
+        text = content.head(TEXT_PREVIEW_ROWS).to_string()
+        if len(content) > TEXT_PREVIEW_ROWS:
+            text += f"\n[{len(content):,} rows]"
+    elif isinstance(content, (dict, list)):
+        text = json.dumps(content, default=str, ensure_ascii=False)
+    else:
+        text = str(content)
+    if len(text) > max_chars:
+        text = text[:max_chars] + f"… [{len(text) - max_chars:,} more characters]"
+    return text
+
+
+class HTMLDisplay:
+    """Render cards in the notebook with IPython.display."""
+    enabled = True
+    html = True
+
+    def emit(self, title: str | None, content: Any, html: str | None = None) -> None:
+        # Imported on first use so headless runs never load IPython
+        from IPython.display import display, HTML
+        display(HTML(html if html is not None else f"<pre>{to_text(content)}</pre>"))
+
+
+class TerminalDisplay:
+    """Print a title line and a plain-text preview of the content."""
+    enabled = True
+    html = False
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def emit(self, title: str | None, content: Any, html: str | None = None) -> None:
+        if title:
+            print(f"── {title} ──", file=self.stream)
+        print(to_text(content), file=self.stream, flush=True)
+
+
+class JSONLDisplay:
+    """Append {"time", "title", "content"} records to a JSON-lines file."""
+    enabled = True
+    html = False
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.getenv("DISPLAY_LOG_PATH", "display_log.jsonl")
+
+    def emit(self, title: str | None, content: Any, html: str | None = None) -> None:
+        if isinstance(content, (dict, list, str, int, float, bool)) or content is None:
+            value = content if len(json.dumps(content, default=str)) <= TEXT_PREVIEW_CHARS else to_text(content)
+        else:
+            value = to_text(content)
+        record = {"time": time.time(), "title": title, "content": value}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str, ensure_ascii=False) + "\n")
+
+
+class NullDisplay:
+    """Discard everything."""
+    enabled = False
+    html = False
+
+    def emit(self, title: str | None, content: Any, html: str | None = None) -> None:
+        pass
+
+
+BACKENDS = {
+    "html": HTMLDisplay,
+    "terminal": TerminalDisplay,
+    "jsonl": JSONLDisplay,
+    "null": NullDisplay,
+}
+
+_backend = None
+
+
+def set_display(backend) -> None:
+    """Select the display backend by name ("html", "terminal", "jsonl", "null") or instance."""
+    global _backend
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown display backend {backend!r}; expected one of {sorted(BACKENDS)}")
+        backend = BACKENDS[backend]()
+    _backend = backend
+
+
+def get_display():
+    """The current display backend (from DISPLAY_BACKEND on first use)."""
+    if _backend is None:
+        set_display(os.getenv("DISPLAY_BACKEND", "html"))
+    return _backend
@@ -1,7 +1,34 @@
-from IPython.display import display, HTML
+from display_backend import get_display
 import json
 
+def _emit_chat_steps(backend, response):
+    """Send each step of an agent run to a text backend, without building any HTML."""
+    tool_sequence = []
+    choice = response.choices[0]
+    for step in getattr(choice, "intermediate_messages", []):
+        if hasattr(step, "tool_calls") and step.tool_calls:
+            for call in step.tool_calls:
+                tool_sequence.append(call.function.name)
+                backend.emit(f"🧠 LLM Action: {call.function.name}", json.loads(call.function.arguments))
+        elif isinstance(step, dict) and step.get("role") == "tool":
+            try:
+                output = json.loads(step.get("content"))
+            except:
+                output = step.get("content")
+            backend.emit(f"🔧 Tool Response: {step.get('name')}", output)
+    backend.emit("✅ Final Assistant Message", choice.message.content)
+    if tool_sequence:
+        backend.emit("🧭 Tool Sequence", " → ".join(tool_sequence))
+
+
 def pretty_print_chat_completion(response):
+    backend = get_display()
+    if not backend.enabled:
+        return
+    if not backend.html:
+        _emit_chat_steps(backend, response)
+        return
+
     def format_json(data):
         try:
             return json.dumps(data, indent=2)
@@ -60,7 +87,7 @@ def pretty_print_chat_completion(response):
         </div>
         """
 
-    display(HTML(steps_html))
+    backend.emit("Chat completion", final_msg, html=steps_html)
 
 
 def pretty_print_chat_completion_html(response):
@@ -0,0 +1,139 @@
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Any
+import requests
+import asyncio
+import os
+
+load_dotenv()
+
+BASE_URL = os.getenv("M3_EMAIL_SERVER_API_URL")
+
+# Seconds to wait for the email server to connect / respond
+EMAIL_API_TIMEOUT = float(os.getenv("M3_EMAIL_API_TIMEOUT", "10"))
+# Retries for connection errors and transient (429 / 5xx) responses
+EMAIL_API_RETRIES = int(os.getenv("M3_EMAIL_API_RETRIES", "3"))
+# Keep-alive connections held open to the email server
+EMAIL_API_POOL_SIZE = int(os.getenv("M3_EMAIL_API_POOL_SIZE", "10"))
+
+
+def make_session(retries: int = EMAIL_API_RETRIES,
+                 pool_size: int = EMAIL_API_POOL_SIZE,
+                 backoff_factor: float = 0.3) -> requests.Session:
+    """
+    Build a requests.Session that reuses keep-alive connections and retries with backoff.
+
+    Only idempotent methods are retried after the request was sent, so a POST
+    (e.g. /send) is never delivered twice; connection failures are retried for
+    every method because nothing reached the server.
+
+    Args:
+        retries (int): Maximum retries per request.
+        pool_size (int): Connections kept open per host.
+        backoff_factor (float): Sleeps backoff_factor * 2**n seconds between retries.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "PATCH", "DELETE"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"User-Agent": "LF-ADP-EmailClient/1.0"})
+    return session
+
+
+class EmailClient:
+    """
+    Pooled HTTP client for the email server.
+
+    One instance is shared by every email tool, so consecutive calls reuse the
+    same TCP connection instead of opening a new one each time.
+    """
+
+    def __init__(self, base_url: str | None = None, timeout: float = EMAIL_API_TIMEOUT,
+                 retries: int = EMAIL_API_RETRIES, pool_size: int = EMAIL_API_POOL_SIZE):
+        self.base_url = (base_url or BASE_URL or "").rstrip("/")
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = make_session(retries=retries, pool_size=pool_size)
+
+    def request(self, method: str, path: str, **kwargs) -> Any:
+        """
+        Send a request to the email server and return the decoded JSON body.
+
+        Args:
+            method (str): HTTP method, e.g. "GET".
+            path (str): Path below the base URL, e.g. "/emails/3".
+            **kwargs: Passed to requests (params, json, ...).
+
+        Returns:
+            Any: The JSON response. Error responses are returned as-is
+            (e.g. {"detail": "Email not found"}), like the server sends them.
+        """
+        return self.send(method, path, **kwargs).json()
+
+    def send(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Like `request`, but return the raw response so callers can check its status."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, f"{self.base_url}{path}", **kwargs)
+
+    def get(self, path: str, **kwargs) -> Any:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> Any:
+        return self.request("POST", path, **kwargs)
+
+    def patch(self, path: str, **kwargs) -> Any:
+        return self.request("PATCH", path, **kwargs)
+
+    def delete(self, path: str, **kwargs) -> Any:
+        return self.request("DELETE", path, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncEmailClient:
+    """
+    Async variant of EmailClient for use inside an event loop.
+
+    Requests run on worker threads over the wrapped client's connection pool,
+    and at most `pool_size` run at once so none has to wait for a connection.
+    """
+
+    def __init__(self, client: EmailClient | None = None):
+        self.client = client or EmailClient()
+        self._limit = None
+
+    async def request(self, method: str, path: str, **kwargs) -> Any:
+        """Async EmailClient.request; same arguments and return value."""
+        # Created lazily so it binds to the running event loop
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.client.pool_size)
+        async with self._limit:
+            return await asyncio.to_thread(self.client.request, method, path, **kwargs)
+
+    async def get(self, path: str, **kwargs) -> Any:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> Any:
+        return await self.request("POST", path, **kwargs)
+
+    async def patch(self, path: str, **kwargs) -> Any:
+        return await self.request("PATCH", path, **kwargs)
+
+    async def delete(self, path: str, **kwargs) -> Any:
+        return await self.request("DELETE", path, **kwargs)
@@ -1,10 +1,47 @@
-from dotenv import load_dotenv
-import requests
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
+from email_client import EmailClient, AsyncEmailClient
+from mailbox_mirror import MailboxMirror
 
-load_dotenv()
+# Shared pooled client: every tool call reuses its keep-alive connections
+client = EmailClient()
+async_client = AsyncEmailClient(client)
 
-BASE_URL = os.getenv("M3_EMAIL_SERVER_API_URL")
+# Optional local SQLite mirror that serves get/search/filter without a round
+# trip; enabled by pointing M3_EMAIL_MIRROR_PATH at a database file
+MIRROR_PATH = os.getenv("M3_EMAIL_MIRROR_PATH")
+mirror = MailboxMirror(MIRROR_PATH, client) if MIRROR_PATH else None
+# In-memory index for ranked search when no mirror is configured; built on first use
+_search_index = None
+
+
+def _local_copies() -> list:
+    return [index for index in (mirror, _search_index) if index is not None]
+
+
+def _store_locally(email: dict) -> None:
+    """Apply an email record returned by a write to the local mirror / search index."""
+    for index in _local_copies():
+        index.store(email)
+
+
+def _remove_locally(email_id: int) -> None:
+    for index in _local_copies():
+        index.remove(email_id)
+
+
+# Batch tools fan out over at most one worker per pooled connection
+batch_executor = ThreadPoolExecutor(max_workers=client.pool_size)
+# Whether the server has a bulk endpoint, per action; unknown until first tried
+bulk_supported = {}
+
+# Emails per page for the paged listing tools, and the most a caller may ask for
+EMAIL_PAGE_SIZE = 20
+MAX_EMAIL_PAGE_SIZE = 100
+# Id of the newest email on the last first page fetched, per listing path; a
+# later page starting with it means the server ignored the offset
+_first_email_id = {}
 
 def list_all_emails() -> list:
     """
@@ -21,7 +58,7 @@ def list_all_emails() -> list:
         - timestamp
         - read (boolean)
     """
-    return requests.get(f"{BASE_URL}/emails").json()
+    return client.get("/emails")
 
 
 def list_unread_emails() -> list:
@@ -32,20 +69,90 @@ def list_unread_emails() -> list:
         List[dict]: A list of unread emails (where `read == False`), 
         ordered from newest to oldest. Same structure as `list_all_emails`.
     """
-    return requests.get(f"{BASE_URL}/emails/unread").json()
+    return client.get("/emails/unread")
+
+
+def list_emails_page(cursor: int = 0, page_size: int = EMAIL_PAGE_SIZE, unread_only: bool = False) -> dict:
+    """
+    Fetch one page of emails, ordered from newest to oldest.
 
+    Call again with `cursor` set to the returned `next_cursor` to get the next
+    page; `next_cursor` is null once there are no more emails.
 
-def search_emails(query: str) -> list:
+    Args:
+        cursor (int): Position to start from; 0 for the first page.
+        page_size (int): Number of emails per page (at most 100).
+        unread_only (bool): Only list unread emails.
+
+    Returns:
+        dict: {"emails": [...], "next_cursor": int or null}. Emails have the
+        same structure as `list_all_emails`.
+    """
+    cursor = max(0, int(cursor))
+    page_size = max(1, min(int(page_size), MAX_EMAIL_PAGE_SIZE))
+    path = "/emails/unread" if unread_only else "/emails"
+    # Ask for one extra email to learn whether another page exists
+    emails = client.get(path, params={"offset": cursor, "limit": page_size + 1})
+    if cursor == 0 and emails:
+        _first_email_id[path] = emails[0]["id"]
+    ignored_paging = len(emails) > page_size + 1 or (
+        cursor > 0 and emails and emails[0]["id"] == _first_email_id.get(path)
+    )
+    if ignored_paging:
+        # The server ignored the paging parameters and sent everything
+        emails = emails[cursor:cursor + page_size + 1]
+
+    has_more = len(emails) > page_size
+    return {"emails": emails[:page_size], "next_cursor": cursor + page_size if has_more else None}
+
+
+def iter_email_pages(page_size: int = EMAIL_PAGE_SIZE, unread_only: bool = False):
+    """
+    Lazily yield the mailbox one page at a time, newest first.
+
+    Args:
+        page_size (int): Number of emails per page.
+        unread_only (bool): Only list unread emails.
+
+    Yields:
+        List[dict]: The emails of each page.
+    """
+    cursor, previous_ids = 0, None
+    while cursor is not None:
+        page = list_emails_page(cursor, page_size=page_size, unread_only=unread_only)
+        ids = [email["id"] for email in page["emails"]]
+        # An empty or repeated page means the paging went wrong; stop rather than loop
+        if not ids or ids == previous_ids:
+            return
+        yield page["emails"]
+        cursor, previous_ids = page["next_cursor"], ids
+
+
+def search_emails(query: str, top_k: int = None) -> list:
     """
     Search emails containing the query in subject, body, or sender.
 
     Args:
         query (str): A keyword or phrase to search for.
+        top_k (int): If set, return only the `top_k` most relevant emails,
+            best first. The query then matches any of its words, and parts
+            in "double quotes" must match as an exact phrase (optional).
 
     Returns:
         List[dict]: A list of emails matching the query string.
     """
-    return requests.get(f"{BASE_URL}/emails/search", params={"q": query}).json()
+    if top_k:
+        global _search_index
+        index = mirror
+        if index is None:
+            if _search_index is None:
+                _search_index = MailboxMirror(":memory:", client)
+            index = _search_index
+        return index.ranked_search(query, top_k=top_k)
+
+    if mirror:
+        return mirror.search(query)
+    return client.get("/emails/search", params={"q": query})
 
 
 def filter_emails(recipient: str = None, date_from: str = None, date_to: str = None) -> list:
@@ -60,6 +167,9 @@ def filter_emails(recipient: str = None, date_from: str = None, date_to: str = N
     Returns:
         List[dict]: A list of emails matching the given filters.
     """
+    if mirror:
+        return mirror.filter(recipient=recipient, date_from=date_from, date_to=date_to)
+
     params = {}
     if recipient:
         params["recipient"] = recipient
@@ -68,7 +178,7 @@ def filter_emails(recipient: str = None, date_from: str = None, date_to: str = N
     if date_to:
         params["date_to"] = date_to
 
-    return requests.get(f"{BASE_URL}/emails/filter", params=params).json()
+    return client.get("/emails/filter", params=params)
 
 
 def get_email(email_id: int) -> dict:
@@ -81,7 +191,9 @@ def get_email(email_id: int) -> dict:
     Returns:
         dict: A single email record if found, else raises HTTP 404.
     """
-    return requests.get(f"{BASE_URL}/emails/{email_id}").json()
+    if mirror:
+        return mirror.get_email(email_id)
+    return client.get(f"/emails/{email_id}")
 
 
 def mark_email_as_read(email_id: int) -> dict:
@@ -94,7 +206,9 @@ def mark_email_as_read(email_id: int) -> dict:
     Returns:
         dict: The updated email record with `read: true`.
     """
-    return requests.patch(f"{BASE_URL}/emails/{email_id}/read").json()
+    email = client.patch(f"/emails/{email_id}/read")
+    _store_locally(email)
+    return email
 
 
 def mark_email_as_unread(email_id: int) -> dict:
@@ -107,7 +221,9 @@ def mark_email_as_unread(email_id: int) -> dict:
     Returns:
         dict: The updated email record with `read: false`.
     """
-    return requests.patch(f"{BASE_URL}/emails/{email_id}/unread").json()
+    email = client.patch(f"/emails/{email_id}/unread")
+    _store_locally(email)
+    return email
 
 
 def send_email(recipient: str, subject: str, body: str) -> dict:
@@ -127,7 +243,9 @@ def send_email(recipient: str, subject: str, body: str) -> dict:
         "subject": subject,
         "body": body
     }
-    return requests.post(f"{BASE_URL}/send", json=payload).json()
+    email = client.post("/send", json=payload)
+    _store_locally(email)
+    return email
 
 
 def delete_email(email_id: int) -> dict:
@@ -140,7 +258,62 @@ def delete_email(email_id: int) -> dict:
     Returns:
         dict: A confirmation message: {"message": "Email deleted"}
     """
-    return requests.delete(f"{BASE_URL}/emails/{email_id}").json()
+    result = client.delete(f"/emails/{email_id}")
+    if "message" in result:
+        _remove_locally(email_id)
+    return result
+
+
+def _matches(email: dict, sender: str = None, read: bool = None, recipient: str = None,
+             date_from: str = None, date_to: str = None, text: str = None) -> bool:
+    """Check an email against every given predicate (the local half of `query_emails`)."""
+    if sender and email["sender"].lower() != sender.lower():
+        return False
+    if read is not None and email["read"] != read:
+        return False
+    if recipient and email["recipient"].lower() != recipient.lower():
+        return False
+    day = email["timestamp"][:10]
+    if (date_from and day < date_from) or (date_to and day > date_to):
+        return False
+    if text:
+        haystack = f"{email['subject']} {email['body']} {email['sender']}".lower()
+        if text.lower() not in haystack:
+            return False
+    return True
+
+
+def query_emails(sender: str = None, read: bool = None, recipient: str = None,
+                 date_from: str = None, date_to: str = None, text: str = None) -> list:
+    """
+    Find emails matching all of the given conditions with a single server request.
+
+    Args:
+        sender (str): Exact sender address, case-insensitive (optional).
+        read (bool): True for read emails only, False for unread only (optional).
+        recipient (str): Exact recipient address (optional).
+        date_from (str): Start date in 'YYYY-MM-DD' format (optional).
+        date_to (str): End date in 'YYYY-MM-DD' format (optional).
+        text (str): Keyword or phrase in the subject, body, or sender (optional).
+
+    Returns:
+        List[dict]: The matching emails, ordered from newest to oldest.
+    """
+    # Let the server do the narrowest filter it supports, then check the rest
+    # locally. A sender address is the most selective; /emails/search also
+    # matches it inside subjects and bodies, which the local check removes.
+    if sender or text:
+        candidates = search_emails(sender or text)
+    elif recipient or date_from or date_to:
+        candidates = filter_emails(recipient=recipient, date_from=date_from, date_to=date_to)
+    elif read is False:
+        candidates = list_unread_emails()
+    else:
+        candidates = list_all_emails()
+
+    return [e for e in candidates
+            if _matches(e, sender=sender, read=read, recipient=recipient,
+                        date_from=date_from, date_to=date_to, text=text)]
 
 
 def search_unread_from_sender(sender: str) -> list:
@@ -153,5 +326,187 @@ def search_unread_from_sender(sender: str) -> list:
     Returns:
         List[dict]: A list of unread emails where the sender matches the given address.
     """
-    unread = list_unread_emails()
-    return [e for e in unread if e['sender'].lower() == sender.lower()]
+    return query_emails(sender=sender, read=False)
+
+
+# ================================
+# Batch operations (one tool call for many emails)
+# ================================
+def _per_email(func, email_id: int) -> dict:
+    """Run a single-email tool, turning a failure into an error entry for that ID."""
+    try:
+        return func(email_id)
+    except Exception as e:
+        return {"id": email_id, "error": str(e)}
+
+
+def _bulk_results(response, count: int) -> list | None:
+    """The per-ID results of a bulk call, or None unless it is a 2xx list of `count` entries."""
+    if not response.ok:
+        return None
+    try:
+        results = response.json()
+    except ValueError:
+        return None
+    if not isinstance(results, list) or len(results) != count:
+        return None
+    return results
+
+
+def _batch(action: str, email_ids: list, func) -> list:
+    """
+    Apply one action to many emails.
+
+    Tries the server's bulk endpoint (POST /emails/bulk/<action>) first. If
+    the server does not have it, that is remembered and the single-email
+    tool is fanned out over the connection pool instead. Any other failed
+    or malformed bulk reply falls back to the fan-out for this call only.
+    """
+    email_ids = list(email_ids)
+    if not email_ids:
+        return []
+    if bulk_supported.get(action, True):
+        response = client.send("POST", f"/emails/bulk/{action}", json={"ids": email_ids})
+        if response.status_code in (404, 405):
+            bulk_supported[action] = False
+        else:
+            results = _bulk_results(response, len(email_ids))
+            if results is not None:
+                bulk_supported[action] = True
+                # Keep local copies in step, as the single-email tools do
+                for email_id, result in zip(email_ids, results):
+                    if action == "delete":
+                        if isinstance(result, dict) and "message" in result:
+                            _remove_locally(email_id)
+                    else:
+                        _store_locally(result)
+                return results
+    return list(batch_executor.map(lambda email_id: _per_email(func, email_id), email_ids))
+
+
+def get_emails(email_ids: list[int]) -> list:
+    """
+    Retrieve several emails by their IDs in one call.
+
+    Args:
+        email_ids (list[int]): The IDs of the emails to fetch.
+
+    Returns:
+        List[dict]: One entry per ID, in the same order: the email record,
+        or an error such as {"detail": "Email not found"}.
+    """
+    return _batch("get", email_ids, get_email)
+
+
+def mark_emails_as_read(email_ids: list[int]) -> list:
+    """
+    Mark several emails as read in one call.
+
+    Args:
+        email_ids (list[int]): The IDs of the emails to mark as read.
+
+    Returns:
+        List[dict]: The updated email records (or errors), in the same order as the IDs.
+    """
+    return _batch("read", email_ids, mark_email_as_read)
+
+
+def mark_emails_as_unread(email_ids: list[int]) -> list:
+    """
+    Mark several emails as unread in one call.
+
+    Args:
+        email_ids (list[int]): The IDs of the emails to mark as unread.
+
+    Returns:
+        List[dict]: The updated email records (or errors), in the same order as the IDs.
+    """
+    return _batch("unread", email_ids, mark_email_as_unread)
+
+
+def delete_emails(email_ids: list[int]) -> list:
+    """
+    Delete several emails in one call.
+
+    Args:
+        email_ids (list[int]): The IDs of the emails to delete.
+
+    Returns:
+        List[dict]: One confirmation (or error) per ID, in the same order as the IDs.
+    """
+    return _batch("delete", email_ids, delete_email)
+
+
+# ================================
+# Async variants (for agents running inside an event loop)
+# ================================
+async def list_all_emails_async() -> list:
+    """Async version of `list_all_emails`."""
+    return await async_client.get("/emails")
+
+
+async def list_unread_emails_async() -> list:
+    """Async version of `list_unread_emails`."""
+    return await async_client.get("/emails/unread")
+
+
+async def search_emails_async(query: str) -> list:
+    """Async version of `search_emails`."""
+    if mirror:
+        # SQLite reads (and any sync) run on a worker thread, off the event loop
+        return await asyncio.to_thread(mirror.search, query)
+    return await async_client.get("/emails/search", params={"q": query})
+
+
+async def get_email_async(email_id: int) -> dict:
+    """Async version of `get_email`."""
+    if mirror:
+        return await asyncio.to_thread(mirror.get_email, email_id)
+    return await async_client.get(f"/emails/{email_id}")
+
+
+async def get_emails_async(email_ids: list) -> list:
+    """
+    Fetch several emails concurrently over the shared connection pool.
+
+    Args:
+        email_ids (list): IDs of the emails to fetch.
+
+    Returns:
+        List[dict]: The email records, in the same order as `email_ids`.
+    """
+    return list(await asyncio.gather(*(get_email_async(email_id) for email_id in email_ids)))
+
+
+async def mark_email_as_read_async(email_id: int) -> dict:
+    """Async version of `mark_email_as_read`."""
+    email = await async_client.patch(f"/emails/{email_id}/read")
+    _store_locally(email)
+    return email
+
+
+async def mark_email_as_unread_async(email_id: int) -> dict:
+    """Async version of `mark_email_as_unread`."""
+    email = await async_client.patch(f"/emails/{email_id}/unread")
+    _store_locally(email)
+    return email
+
+
+async def send_email_async(recipient: str, subject: str, body: str) -> dict:
+    """Async version of `send_email`."""
+    payload = {
+        "recipient": recipient,
+        "subject": subject,
+        "body": body
+    }
+    email = await async_client.post("/send", json=payload)
+    _store_locally(email)
+    return email
+
+
+async def delete_email_async(email_id: int) -> dict:
+    """Async version of `delete_email`."""
+    result = await async_client.delete(f"/emails/{email_id}")
+    if "message" in result:
+        _remove_locally(email_id)
+    return result
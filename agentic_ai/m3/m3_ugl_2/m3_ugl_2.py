@@ -87,11 +87,15 @@ response = client.chat.completions.create(
     )}],
     tools=[ # list of tools that the LLM can access
         email_tools.search_unread_from_sender,
-        email_tools.list_unread_emails,
+        email_tools.list_emails_page,
         email_tools.search_emails,
         email_tools.get_email,
         email_tools.mark_email_as_read,
-        email_tools.send_email
+        email_tools.send_email,
+        email_tools.query_emails,
+        # batch tools: one call handles a whole list of email IDs
+        email_tools.get_emails,
+        email_tools.mark_emails_as_read
     ],
     max_turns=5,
 )
@@ -109,12 +113,15 @@ response = client.chat.completions.create(
     )}],
     tools=[ # list of tools that the LLM can access
         email_tools.search_unread_from_sender,
-        email_tools.list_unread_emails,
+        email_tools.list_emails_page,
         email_tools.search_emails,
         email_tools.get_email,
         email_tools.mark_email_as_read,
         email_tools.send_email,
-        email_tools.delete_email
+        email_tools.delete_email,
+        email_tools.get_emails,
+        email_tools.mark_emails_as_read,
+        email_tools.delete_emails
     ],
     max_turns=5
 )
@@ -134,12 +141,15 @@ response = client.chat.completions.create(
     )}],
     tools=[
         email_tools.search_unread_from_sender,
-        email_tools.list_unread_emails,
+        email_tools.list_emails_page,
         email_tools.search_emails,
         email_tools.get_email,
         email_tools.mark_email_as_read,
         email_tools.send_email,
-        email_tools.delete_email
+        email_tools.delete_email,
+        email_tools.get_emails,
+        email_tools.mark_emails_as_read,
+        email_tools.delete_emails
     ],
     max_turns=5
 )
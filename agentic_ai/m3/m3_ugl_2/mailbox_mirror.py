@@ -0,0 +1,254 @@
+from email_client import EmailClient
+import threading
+import sqlite3
+import json
+import re
+import time
+import os
+
+# Seconds between incremental syncs; reads in between are served locally only
+MIRROR_SYNC_INTERVAL = float(os.getenv("M3_EMAIL_MIRROR_SYNC_INTERVAL", "5"))
+# Seconds between full re-syncs, which also pick up read-state changes and
+# deletions made by other clients
+MIRROR_FULL_SYNC_INTERVAL = float(os.getenv("M3_EMAIL_MIRROR_FULL_SYNC_INTERVAL", "300"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS emails (
+    id INTEGER PRIMARY KEY,
+    sender TEXT,
+    recipient TEXT,
+    subject TEXT,
+    body TEXT,
+    timestamp TEXT,
+    read INTEGER,
+    data TEXT              -- the record exactly as the server sent it
+);
+CREATE INDEX IF NOT EXISTS emails_timestamp ON emails (timestamp);
+CREATE INDEX IF NOT EXISTS emails_recipient ON emails (recipient COLLATE NOCASE);
+
+-- Trigram index so MATCH behaves like the server's substring search
+CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5(
+    subject, body, sender, content='emails', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS emails_ai AFTER INSERT ON emails BEGIN
+    INSERT INTO emails_fts (rowid, subject, body, sender)
+    VALUES (new.id, new.subject, new.body, new.sender);
+END;
+CREATE TRIGGER IF NOT EXISTS emails_ad AFTER DELETE ON emails BEGIN
+    INSERT INTO emails_fts (emails_fts, rowid, subject, body, sender)
+    VALUES ('delete', old.id, old.subject, old.body, old.sender);
+END;
+CREATE TRIGGER IF NOT EXISTS emails_au AFTER UPDATE ON emails BEGIN
+    INSERT INTO emails_fts (emails_fts, rowid, subject, body, sender)
+    VALUES ('delete', old.id, old.subject, old.body, old.sender);
+    INSERT INTO emails_fts (rowid, subject, body, sender)
+    VALUES (new.id, new.subject, new.body, new.sender);
+END;
+
+-- Word index for BM25-ranked keyword and phrase search
+CREATE VIRTUAL TABLE IF NOT EXISTS emails_words USING fts5(
+    subject, body, sender, content='emails', content_rowid='id', tokenize='unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS emails_words_ai AFTER INSERT ON emails BEGIN
+    INSERT INTO emails_words (rowid, subject, body, sender)
+    VALUES (new.id, new.subject, new.body, new.sender);
+END;
+CREATE TRIGGER IF NOT EXISTS emails_words_ad AFTER DELETE ON emails BEGIN
+    INSERT INTO emails_words (emails_words, rowid, subject, body, sender)
+    VALUES ('delete', old.id, old.subject, old.body, old.sender);
+END;
+CREATE TRIGGER IF NOT EXISTS emails_words_au AFTER UPDATE ON emails BEGIN
+    INSERT INTO emails_words (emails_words, rowid, subject, body, sender)
+    VALUES ('delete', old.id, old.subject, old.body, old.sender);
+    INSERT INTO emails_words (rowid, subject, body, sender)
+    VALUES (new.id, new.subject, new.body, new.sender);
+END;
+
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL);
+"""
+
+# BM25 column weights for subject, body, sender: a hit in the subject counts double
+BM25_WEIGHTS = (2.0, 1.0, 1.0)
+
+# Newest to oldest, like the server
+ORDER = "ORDER BY timestamp DESC, id DESC"
+
+
+class MailboxMirror:
+    """
+    Local SQLite copy of the mailbox that serves reads without a round trip.
+
+    The mirror starts with a full download. After that it syncs incrementally,
+    fetching only emails from the newest day it already holds onward, at most
+    once every `sync_interval` seconds. Every `full_sync_interval` seconds it
+    downloads everything again, so changes made by other clients (read state,
+    deletions) are not missed for long. Writes made through `email_tools` go
+    to the server first and are then applied here with `store` / `remove`.
+    """
+
+    def __init__(self, path: str, client: EmailClient | None = None,
+                 sync_interval: float = MIRROR_SYNC_INTERVAL,
+                 full_sync_interval: float = MIRROR_FULL_SYNC_INTERVAL):
+        self.client = client or EmailClient()
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Batch tools call in from several threads; one lock serialises them
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        had_word_index = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'emails_words'"
+        ).fetchone()
+        self._db.executescript(SCHEMA)
+        if not had_word_index:
+            # Index emails mirrored before the word index existed
+            with self._db:
+                self._db.execute("INSERT INTO emails_words (emails_words) VALUES ('rebuild')")
+
+    # ----------------------------
+    # Sync
+    # ----------------------------
+    def _meta(self, key: str) -> float:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0.0
+
+    def _set_meta(self, key: str, value: float) -> None:
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _upsert(self, emails: list) -> None:
+        self._db.executemany(
+            "INSERT INTO emails (id, sender, recipient, subject, body, timestamp, read, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET sender = excluded.sender, recipient = excluded.recipient, "
+            "subject = excluded.subject, body = excluded.body, timestamp = excluded.timestamp, "
+            "read = excluded.read, data = excluded.data",
+            [(e["id"], e["sender"], e["recipient"], e["subject"], e["body"],
+              e["timestamp"], int(bool(e["read"])), json.dumps(e)) for e in emails],
+        )
+
+    def full_sync(self) -> None:
+        """Replace the mirror's contents with the server's whole mailbox."""
+        emails = self.client.get("/emails")
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM emails")
+            self._upsert(emails)
+            now = time.time()
+            self._set_meta("last_full_sync", now)
+            self._set_meta("last_sync", now)
+
+    def sync(self, force: bool = False) -> None:
+        """Bring the mirror up to date if the last sync is older than `sync_interval`."""
+        now = time.time()
+        with self._lock:
+            if not force and now - self._meta("last_sync") < self.sync_interval:
+                return
+            if now - self._meta("last_full_sync") >= self.full_sync_interval:
+                self.full_sync()
+                return
+
+            newest = self._db.execute("SELECT MAX(timestamp) FROM emails").fetchone()[0]
+            if newest is None:
+                self.full_sync()
+                return
+            # The server filters by day, so re-fetch the newest day; upserts are idempotent
+            emails = self.client.get("/emails/filter", params={"date_from": newest[:10]})
+            with self._db:
+                self._upsert(emails)
+                self._set_meta("last_sync", now)
+
+    # ----------------------------
+    # Writes made through email_tools
+    # ----------------------------
+    def store(self, email: dict) -> None:
+        """Apply a created or updated email record returned by the server."""
+        if not isinstance(email, dict) or "id" not in email:
+            # An error response such as {"detail": "Email not found"}
+            return
+        with self._lock, self._db:
+            self._upsert([email])
+
+    def remove(self, email_id: int) -> None:
+        """Drop an email the server has deleted."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM emails WHERE id = ?", (email_id,))
+
+    # ----------------------------
+    # Reads
+    # ----------------------------
+    def _select(self, where: str = "", params: tuple = ()) -> list:
+        rows = self._db.execute(f"SELECT data FROM emails {where} {ORDER}", params).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def get_email(self, email_id: int) -> dict:
+        """Return one email, asking the server only if the mirror does not have it."""
+        self.sync()
+        with self._lock:
+            row = self._db.execute("SELECT data FROM emails WHERE id = ?", (email_id,)).fetchone()
+        if row:
+            return json.loads(row[0])
+        email = self.client.get(f"/emails/{email_id}")
+        self.store(email)
+        return email
+
+    def search(self, query: str) -> list:
+        """Emails whose subject, body, or sender contains `query` (case-insensitive)."""
+        self.sync()
+        with self._lock:
+            if len(query) >= 3:
+                # Quoted so the query is matched as a literal string
+                phrase = '"' + query.replace('"', '""') + '"'
+                return self._select(
+                    "WHERE id IN (SELECT rowid FROM emails_fts WHERE emails_fts MATCH ?)", (phrase,)
+                )
+            # Trigrams need at least three characters
+            pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            return self._select(
+                "WHERE subject LIKE ?1 ESCAPE '\\' OR body LIKE ?1 ESCAPE '\\' OR sender LIKE ?1 ESCAPE '\\'",
+                (pattern,),
+            )
+
+    def ranked_search(self, query: str, top_k: int = 10) -> list:
+        """
+        The `top_k` emails most relevant to `query`, best first (BM25).
+
+        Words are matched individually (any word may match) and "double-quoted"
+        parts must appear as an exact phrase.
+        """
+        terms = []
+        for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+            text = (phrase or word).strip()
+            if text:
+                # Quote every term so FTS5 operators in user text are matched literally
+                terms.append('"' + text.replace('"', '""') + '"')
+        if not terms:
+            return []
+
+        self.sync()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT e.data FROM emails_words JOIN emails e ON e.id = emails_words.rowid "
+                "WHERE emails_words MATCH ? ORDER BY bm25(emails_words, ?, ?, ?) LIMIT ?",
+                (" OR ".join(terms), *BM25_WEIGHTS, top_k),
+            ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def filter(self, recipient: str = None, date_from: str = None, date_to: str = None) -> list:
+        """Emails matching a recipient and/or an inclusive 'YYYY-MM-DD' date range."""
+        self.sync()
+        clauses, params = [], []
+        if recipient:
+            clauses.append("recipient = ? COLLATE NOCASE")
+            params.append(recipient)
+        if date_from:
+            clauses.append("substr(timestamp, 1, 10) >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("substr(timestamp, 1, 10) <= ?")
+            params.append(date_to)
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        with self._lock:
+            return self._select(where, tuple(params))
+
+    def close(self) -> None:
+        self._db.close()
@@ -5,21 +5,25 @@
 # --- Standard library ---
 import os
 import json
+import math
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from html import escape
 from datetime import datetime  # keep if used later
 from urllib.parse import urljoin
 
 # --- Third-party ---
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 from dotenv import load_dotenv
-from IPython.display import display, HTML
 
 import base64
 from typing import Any
 
 # --- Local / project ---
-# (add your local imports here, e.g. `import utils`)
+from display_backend import get_display
 
 # ================================
 # Environment & HTTP session
@@ -35,96 +39,177 @@ session.headers.update({"User-Agent": "LF-ADP-EmailClient/1.0"})
 # ================================
 # Helpers
 # ================================
-def print_html(content: Any, title: str | None = None, is_image: bool = False):
+# How much of a DataFrame / text / JSON body the display helpers show
+PREVIEW_ROWS = int(os.getenv("DISPLAY_PREVIEW_ROWS", "20"))
+PREVIEW_CHARS = int(os.getenv("DISPLAY_PREVIEW_CHARS", "4000"))
+# Images up to this size are inlined as base64; larger ones become a thumbnail
+# (or a reference to the file if Pillow is unavailable)
+INLINE_IMAGE_MAX_BYTES = int(os.getenv("DISPLAY_INLINE_IMAGE_MAX_BYTES", str(256 * 1024)))
+THUMBNAIL_SIZE = (480, 480)
+
+CARD_CSS = """
+<style>
+.pretty-card{
+  font-family: ui-sans-serif, system-ui;
+  border: 2px solid transparent;
+  border-radius: 14px;
+  padding: 14px 16px;
+  margin: 10px 0;
+  background: linear-gradient(#fff, #fff) padding-box,
+              linear-gradient(135deg, #3b82f6, #9333ea) border-box;
+  color: #111;
+  box-shadow: 0 4px 12px rgba(0,0,0,.08);
+}
+.pretty-title{
+  font-weight:700;
+  margin-bottom:8px;
+  font-size:14px;
+  color:#111;
+}
+/* 🔒 Solo afecta lo DENTRO de la tarjeta */
+.pretty-card pre, 
+.pretty-card code {
+  background: #f3f4f6;
+  color: #111;
+  padding: 8px;
+  border-radius: 8px;
+  display: block;
+  overflow-x: auto;
+  font-size: 13px;
+  white-space: pre-wrap;
+}
+.pretty-card img { max-width: 100%; height: auto; border-radius: 8px; }
+.pretty-card table.pretty-table {
+  border-collapse: collapse;
+  width: 100%;
+  font-size: 13px;
+  color: #111;
+}
+.pretty-card table.pretty-table th, 
+.pretty-card table.pretty-table td {
+  border: 1px solid #e5e7eb;
+  padding: 6px 8px;
+  text-align: left;
+}
+.pretty-card table.pretty-table th { background: #f9fafb; font-weight: 600; }
+.pretty-note { font-size: 12px; color: #6b7280; margin-top: 6px; }
+</style>
+"""
+
+_css_emitted = False
+
+
+def _stylesheet() -> str:
+    """Return the card CSS the first time it is needed in this session, then ""."""
+    global _css_emitted
+    if _css_emitted:
+        return ""
+    _css_emitted = True
+    return CARD_CSS
+
+
+def reset_styles() -> None:
+    """Emit the card CSS again with the next card (e.g. after clearing all notebook output)."""
+    global _css_emitted
+    _css_emitted = False
+
+
+def _truncate(text: str, max_chars: int) -> tuple[str, str]:
+    """Cut text to `max_chars`; returns (text, note about what was cut or "")."""
+    if len(text) <= max_chars:
+        return text, ""
+    return text[:max_chars], f"… {len(text) - max_chars:,} more characters not shown"
+
+
+def _render_image(source: str) -> str:
+    """<img> for a path or URL: inline if small, else a thumbnail or a file reference."""
+    if source.startswith(("http://", "https://", "data:")):
+        return f'<img src="{escape(source)}" alt="Image">'
+
+    size = os.path.getsize(source)
+    if size <= INLINE_IMAGE_MAX_BYTES:
+        with open(source, "rb") as img_file:
+            b64 = base64.b64encode(img_file.read()).decode("utf-8")
+        return f'<img src="data:image/png;base64,{b64}" alt="Image">'
+
+    note = f'<div class="pretty-note">{escape(source)} ({size / 1024:,.0f} KiB)</div>'
+    try:
+        from PIL import Image
+        import io
+        with Image.open(source) as img:
+            img.thumbnail(THUMBNAIL_SIZE)
+            buffer = io.BytesIO()
+            img.convert("RGB").save(buffer, format="JPEG", quality=80)
+        b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+        return f'<img src="data:image/jpeg;base64,{b64}" alt="Thumbnail">{note}'
+    except (ImportError, OSError):
+        # No Pillow, or a file it cannot open (SVG, corrupt image): reference the
+        # file instead; notebooks resolve paths relative to the notebook
+        return f'<img src="{escape(source)}" alt="Image">{note}'
+
+
+def print_html(content: Any, title: str | None = None, is_image: bool = False,
+               max_rows: int | None = None, max_chars: int | None = None):
     """
     Pretty-print inside a styled card.
     - If is_image=True and content is a string: treat as image path/URL and render <img>.
-    - If content is a pandas DataFrame/Series: render as an HTML table.
-    - Otherwise (strings/otros): show as code/text in <pre><code>.
+      Large image files are shown as a thumbnail instead of inlining the whole file.
+    - If content is a pandas DataFrame/Series: render the first `max_rows` rows as an HTML table.
+    - Otherwise (strings/otros): show the first `max_chars` characters as code/text in <pre><code>.
+    The card CSS is sent with the first card only (see `reset_styles`).
+    Output goes to the current display backend (see display_backend.py).
     """
-    try:
-        from html import escape as _escape
-    except ImportError:
-        _escape = lambda x: x
+    backend = get_display()
+    if not backend.enabled:
+        return
+    if not backend.html:
+        backend.emit(title, f"[image] {content}" if is_image else content)
+        return
 
-    def image_to_base64(image_path: str) -> str:
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode("utf-8")
+    max_rows = PREVIEW_ROWS if max_rows is None else max_rows
+    max_chars = PREVIEW_CHARS if max_chars is None else max_chars
+    note = ""
 
     # Render content
     if is_image and isinstance(content, str):
-        b64 = image_to_base64(content)
-        rendered = f'<img src="data:image/png;base64,{b64}" alt="Image" style="max-width:100%; height:auto; border-radius:8px;">'
-    elif isinstance(content, pd.DataFrame):
-        rendered = content.to_html(classes="pretty-table", index=False, border=0, escape=False)
-    elif isinstance(content, pd.Series):
-        rendered = content.to_frame().to_html(classes="pretty-table", border=0, escape=False)
-    elif isinstance(content, str):
-        rendered = f"<pre><code>{_escape(content)}</code></pre>"
+        rendered = _render_image(content)
+    elif isinstance(content, (pd.DataFrame, pd.Series)):
+        frame = content.to_frame() if isinstance(content, pd.Series) else content
+        rendered = frame.head(max_rows).to_html(
+            classes="pretty-table", index=isinstance(content, pd.Series), border=0, escape=False
+        )
+        if len(frame) > max_rows:
+            note = f"showing {max_rows:,} of {len(frame):,} rows"
     else:
-        rendered = f"<pre><code>{_escape(str(content))}</code></pre>"
-
-    css = """
-    <style>
-    .pretty-card{
-      font-family: ui-sans-serif, system-ui;
-      border: 2px solid transparent;
-      border-radius: 14px;
-      padding: 14px 16px;
-      margin: 10px 0;
-      background: linear-gradient(#fff, #fff) padding-box,
-                  linear-gradient(135deg, #3b82f6, #9333ea) border-box;
-      color: #111;
-      box-shadow: 0 4px 12px rgba(0,0,0,.08);
-    }
-    .pretty-title{
-      font-weight:700;
-      margin-bottom:8px;
-      font-size:14px;
-      color:#111;
-    }
-    /* 🔒 Solo afecta lo DENTRO de la tarjeta */
-    .pretty-card pre, 
-    .pretty-card code {
-      background: #f3f4f6;
-      color: #111;
-      padding: 8px;
-      border-radius: 8px;
-      display: block;
-      overflow-x: auto;
-      font-size: 13px;
-      white-space: pre-wrap;
-    }
-    .pretty-card img { max-width: 100%; height: auto; border-radius: 8px; }
-    .pretty-card table.pretty-table {
-      border-collapse: collapse;
-      width: 100%;
-      font-size: 13px;
-      color: #111;
-    }
-    .pretty-card table.pretty-table th, 
-    .pretty-card table.pretty-table td {
-      border: 1px solid #e5e7eb;
-      padding: 6px 8px;
-      text-align: left;
-    }
-    .pretty-card table.pretty-table th { background: #f9fafb; font-weight: 600; }
-    </style>
-    """
+        text, note = _truncate(content if isinstance(content, str) else str(content), max_chars)
+        rendered = f"<pre><code>{escape(text)}</code></pre>"
 
     title_html = f'<div class="pretty-title">{title}</div>' if title else ""
-    card = f'<div class="pretty-card">{title_html}{rendered}</div>'
-    display(HTML(css + card))
+    note_html = f'<div class="pretty-note">{note}</div>' if note else ""
+    card = f'<div class="pretty-card">{title_html}{rendered}{note_html}</div>'
+    backend.emit(title, content, html=_stylesheet() + card)
+
+def pretty_display(title: str, response: requests.Response, max_chars: int | None = None):
+    """Render an HTTP response in a styled block; returns parsed content (JSON if possible).
 
-def pretty_display(title: str, response: requests.Response):
-    """Render an HTTP response in a styled block; returns parsed content (JSON if possible)."""
+    Only the first `max_chars` characters of the body are shown; the full content is returned.
+    """
     status = response.status_code
     try:
         content = response.json()
-        body = json.dumps(content, indent=2)
     except Exception:
         content = response.text
-        body = content
+
+    backend = get_display()
+    if not backend.html:
+        if backend.enabled:
+            backend.emit(f"{title}: Status {status}", content)
+        return content
+
+    body = content if isinstance(content, str) else json.dumps(content, indent=2)
+    body, note = _truncate(body, PREVIEW_CHARS if max_chars is None else max_chars)
+    if note:
+        body += "\n" + note
 
     html = f"""
     <div style='border:1px solid #ccc; border-left:5px solid #007bff; padding:10px; margin:10px 0; background:#f9f9f9; color:#000;'>
@@ -133,7 +218,7 @@ def pretty_display(title: str, response: requests.Response):
         <pre style='font-size:12px; margin-top:10px; white-space:pre-wrap; color:#000;'>{escape(body)}</pre>
     </div>
     """
-    display(HTML(html))
+    backend.emit(title, content, html=html)
     return content
 
 # ================================
@@ -194,9 +279,21 @@ def test_delete_email(email_id: str):
     return pretty_display(f"DELETE /emails/{email_id}", r)
 
 
+def _llm_endpoint(api_url: str | None = None) -> str:
+    """Resolve the LLM server's /prompt endpoint from `api_url` or M3_LLM_SERVER_URL."""
+    # Resolve API base URL
+    base = api_url or os.getenv("M3_LLM_SERVER_URL")
+    if not base:
+        raise RuntimeError("M3_LLM_SERVER_URL is not set. Put it in your .env (e.g., http://127.0.0.1:5001).")
+
+    # Build final endpoint; accept both with/without trailing /prompt
+    return base if base.rstrip("/").endswith("/prompt") else urljoin(base.rstrip("/") + "/", "prompt")
+
+
 def call_llm_email_agent(prompt: str,
                          api_url: str | None = None,
-                         timeout: int = 30) -> dict:
+                         timeout: int = 30,
+                         http: requests.Session | None = None) -> dict:
     """
     Calls the M3 LLM server with a natural-language instruction.
 
@@ -204,20 +301,16 @@ def call_llm_email_agent(prompt: str,
         prompt: Instruction for the agent (e.g., "Check unread emails...").
         api_url: Base URL of the LLM server. If None, uses env var M3_LLM_SERVER_URL.
         timeout: HTTP timeout in seconds.
+        http: Session to send the request with (reuses its connections). If None,
+            a one-off connection is used.
 
     Returns:
         dict with keys: ok (bool), status (int), response (str|None), raw (dict|str)
     """
-    # Resolve API base URL
-    base = api_url or os.getenv("M3_LLM_SERVER_URL")
-    if not base:
-        raise RuntimeError("M3_LLM_SERVER_URL is not set. Put it in your .env (e.g., http://127.0.0.1:5001).")
-
-    # Build final endpoint; accept both with/without trailing /prompt
-    endpoint = base if base.rstrip("/").endswith("/prompt") else urljoin(base.rstrip("/") + "/", "prompt")
+    endpoint = _llm_endpoint(api_url)
 
     try:
-        r = requests.post(endpoint, json={"prompt": prompt}, timeout=timeout)
+        r = (http or requests).post(endpoint, json={"prompt": prompt}, timeout=timeout)
     except requests.RequestException as e:
         return {"ok": False, "status": None, "response": None, "raw": str(e)}
 
@@ -228,3 +321,76 @@ def call_llm_email_agent(prompt: str,
 
     ok = (r.status_code == 200)
     return {"ok": ok, "status": r.status_code, "response": (data.get("response") if isinstance(data, dict) else None), "raw": data}
+
+
+def latency_percentiles(latencies: list[float], percentiles=(50, 90, 95, 99)) -> dict:
+    """
+    Nearest-rank percentiles of a list of latencies.
+
+    Returns:
+        dict like {"p50": 1.2, "p90": 2.3, ...}; empty if there are no latencies.
+    """
+    ordered = sorted(latencies)
+    if not ordered:
+        return {}
+    return {f"p{p}": ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] for p in percentiles}
+
+
+async def run_llm_email_agent_batch(prompts: list[str],
+                                    api_url: str | None = None,
+                                    concurrency: int = 8,
+                                    timeout: int = 30) -> dict:
+    """
+    Sends many prompts to the M3 LLM server concurrently, e.g. to load-test it.
+
+    At most `concurrency` requests are in flight at once, and they share one
+    pooled session so connections are reused between prompts.
+
+    Args:
+        prompts: Instructions for the agent.
+        api_url: Base URL of the LLM server. If None, uses env var M3_LLM_SERVER_URL.
+        concurrency: Maximum number of requests in flight.
+        timeout: HTTP timeout in seconds for each request.
+
+    Returns:
+        dict with keys:
+          results (list): one `call_llm_email_agent` result per prompt, in order,
+                          each with an added `latency` in seconds
+          latency (dict): p50/p90/p95/p99 latency in seconds
+          errors (int): number of results that are not ok
+          wall_time (float): seconds for the whole batch
+          throughput (float): prompts completed per second
+    """
+    endpoint = _llm_endpoint(api_url)
+    http = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=concurrency)
+    http.mount("http://", adapter)
+    http.mount("https://", adapter)
+    # One worker per in-flight request, so latencies don't include queueing for a thread
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    limit = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def run_one(prompt: str) -> dict:
+        async with limit:
+            start = time.perf_counter()
+            result = await loop.run_in_executor(
+                executor, call_llm_email_agent, prompt, endpoint, timeout, http
+            )
+            return {**result, "latency": time.perf_counter() - start}
+
+    start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(run_one(prompt) for prompt in prompts))
+    finally:
+        executor.shutdown(wait=False)
+        http.close()
+    wall_time = time.perf_counter() - start
+
+    return {
+        "results": list(results),
+        "latency": latency_percentiles([r["latency"] for r in results]),
+        "errors": sum(not r["ok"] for r in results),
+        "wall_time": wall_time,
+        "throughput": len(results) / wall_time if wall_time else 0.0,
+    }
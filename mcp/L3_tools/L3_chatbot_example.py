@@ -5,9 +5,13 @@
 import arxiv
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from dotenv import load_dotenv
 import anthropic
+from conversation import Conversation
+from prompt_cache import CacheUsage, cache_tool_definitions
 
 
 PAPER_DIR = "papers"
@@ -172,57 +176,73 @@ def execute_tool(tool_name, tool_args):
 load_dotenv() 
 client = anthropic.Anthropic()
 
+# History kept across queries, trimmed to a token budget
+conversation = Conversation()
+# Prompt-cache hits and misses of every model call
+cache_usage = CacheUsage()
+
+# Print text as it is generated instead of once the response is complete
+STREAM_OUTPUT = True
+# Runs tools while the rest of the response is still streaming. One worker:
+# search_papers rewrites papers_info.json without locking, so tools must not
+# overlap each other; each still starts as soon as its block is complete
+tool_executor = ThreadPoolExecutor(max_workers=1)
+
+
+def run_tool(content):
+    """Execute one tool_use block and return its tool_result block."""
+    print(f"Calling tool {content.name} with args {content.input}")
+    return {
+        "type": "tool_result",
+        "tool_use_id": content.id,
+        "content": execute_tool(content.name, content.input)
+    }
+
 
 def process_query(query):
     
-    messages = [{'role': 'user', 'content': query}]
-    
-    response = client.messages.create(max_tokens = 2024,
-                                  model = 'claude-3-7-sonnet-20250219', 
-                                  tools = tools,
-                                  messages = messages)
+    conversation.add_user_query(query)
     
-    process_query = True
-    while process_query:
-        assistant_content = []
-
-        for content in response.content:
-            if content.type == 'text':
-                
-                print(content.text)
-                assistant_content.append(content)
-                
-                if len(response.content) == 1:
-                    process_query = False
-            
-            elif content.type == 'tool_use':
-                
-                assistant_content.append(content)
-                messages.append({'role': 'assistant', 'content': assistant_content})
-                
-                tool_id = content.id
-                tool_args = content.input
-                tool_name = content.name
-                print(f"Calling tool {tool_name} with args {tool_args}")
-                
-                result = execute_tool(tool_name, tool_args)
-                messages.append({"role": "user", 
-                                  "content": [
-                                      {
-                                          "type": "tool_result",
-                                          "tool_use_id": tool_id,
-                                          "content": result
-                                      }
-                                  ]
-                                })
-                response = client.messages.create(max_tokens = 2024,
-                                  model = 'claude-3-7-sonnet-20250219', 
-                                  tools = tools,
-                                  messages = messages) 
-                
-                if len(response.content) == 1 and response.content[0].type == "text":
-                    print(response.content[0].text)
-                    process_query = False
+    while True:
+        tool_calls = []
+        start = time.perf_counter()
+        first_token_at = None
+        
+        with client.messages.stream(max_tokens = 2024,
+                                    model = 'claude-3-7-sonnet-20250219', 
+                                    tools = cache_tool_definitions(tools),
+                                    messages = conversation.to_api()) as stream:
+            for event in stream:
+                if event.type in ('text', 'input_json') and first_token_at is None:
+                    first_token_at = time.perf_counter()
+                if event.type == 'text' and STREAM_OUTPUT:
+                    print(event.text, end="", flush=True)
+                elif event.type == 'content_block_stop' and event.content_block.type == 'tool_use':
+                    # The tool's input is complete, so run it while the rest streams in
+                    tool_calls.append(tool_executor.submit(run_tool, event.content_block))
+            response = stream.get_final_message()
+        end = time.perf_counter()
+        
+        if STREAM_OUTPUT:
+            print()
+        else:
+            for content in response.content:
+                if content.type == 'text':
+                    print(content.text)
+        
+        if first_token_at is not None:
+            tokens_per_second = response.usage.output_tokens / max(end - first_token_at, 1e-6)
+            print(f"[stream] time to first token {first_token_at - start:.2f}s, "
+                  f"{tokens_per_second:.1f} tokens/s")
+        print(CacheUsage.describe(cache_usage.record(response.usage)))
+        conversation.add_assistant(response.content)
+        
+        # Done once the model answers without asking for a tool
+        if not tool_calls:
+            break
+        
+        # Futures were submitted in tool_use order, so results keep that order
+        conversation.add_tool_results([future.result() for future in tool_calls])
 
 
 
@@ -0,0 +1,134 @@
+import json
+import re
+from typing import List
+from prompt_cache import as_block, cache_message_prefix
+
+# Rough characters-per-token ratio for English text and JSON; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+# Appended to a shortened tool result; its presence means the result is never cut again
+TRUNCATION_NOTE = "\n... [truncated {omitted} characters of an earlier tool result]"
+TRUNCATION_NOTE_RE = re.compile(r"\n\.\.\. \[truncated \d+ characters of an earlier tool result\]$")
+
+
+def estimate_tokens(message: dict) -> int:
+    """Approximate the number of input tokens a message costs."""
+    return len(json.dumps(message, default=str)) // CHARS_PER_TOKEN + 1
+
+
+class Conversation:
+    """
+    Message history for a chat session, kept under an approximate token budget.
+
+    Messages are stored as plain dicts and persist across queries. When the
+    history grows past `max_tokens`, tool results outside the most recent
+    turns are first cut down to a short preview. Only if that is not enough
+    are the oldest whole exchanges dropped. Earlier messages are rewritten
+    only when the budget forces it, so the prefix sent to the API stays
+    identical from one turn to the next and can be served from the prompt cache.
+    """
+
+    def __init__(self, max_tokens: int = 50_000, keep_recent_turns: int = 2,
+                 tool_result_preview_chars: int = 500):
+        self.max_tokens = max_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.tool_result_preview_chars = tool_result_preview_chars
+        self.messages: List[dict] = []
+        # Estimated tokens of each message in self.messages
+        self._tokens: List[int] = []
+
+    # ----------------------------
+    # Recording messages
+    # ----------------------------
+    def add_user_query(self, query: str) -> None:
+        """Start a new exchange with the user's query."""
+        self._append({"role": "user", "content": query})
+
+    def add_assistant(self, content) -> None:
+        """Record the assistant's response content blocks."""
+        self._append({"role": "assistant", "content": [as_block(block) for block in content]})
+
+    def add_tool_results(self, tool_results: List[dict]) -> None:
+        """Record the tool_result blocks answering the assistant's last tool_use blocks."""
+        blocks = []
+        for result in tool_results:
+            content = result["content"]
+            if not isinstance(content, str):
+                content = [as_block(block) for block in content]
+            blocks.append({**result, "content": content})
+        self._append({"role": "user", "content": blocks})
+
+    def reset(self) -> None:
+        self.messages = []
+        self._tokens = []
+
+    def total_tokens(self) -> int:
+        return sum(self._tokens)
+
+    # ----------------------------
+    # Budget enforcement
+    # ----------------------------
+    def _append(self, message: dict) -> None:
+        self.messages.append(message)
+        self._tokens.append(estimate_tokens(message))
+        self._enforce_budget()
+
+    def _is_query(self, index: int) -> bool:
+        message = self.messages[index]
+        return message["role"] == "user" and isinstance(message["content"], str)
+
+    def _shorten_tool_results(self, index: int) -> bool:
+        """Replace long tool results in one message with a preview; returns True if anything changed."""
+        message = self.messages[index]
+        if message["role"] != "user" or isinstance(message["content"], str):
+            return False
+
+        changed = False
+        blocks = []
+        for block in message["content"]:
+            if block.get("type") == "tool_result":
+                content = block["content"]
+                if not isinstance(content, str):
+                    content = "\n".join(item.get("text", json.dumps(item)) for item in content)
+                # Shorten each result once: re-cutting a preview would rewrite the message again
+                if (len(content) > self.tool_result_preview_chars
+                        and not TRUNCATION_NOTE_RE.search(content)):
+                    omitted = len(content) - self.tool_result_preview_chars
+                    content = (content[:self.tool_result_preview_chars]
+                               + TRUNCATION_NOTE.format(omitted=omitted))
+                    block = {**block, "content": content}
+                    changed = True
+            blocks.append(block)
+
+        if changed:
+            self.messages[index] = {**message, "content": blocks}
+            self._tokens[index] = estimate_tokens(self.messages[index])
+        return changed
+
+    def _enforce_budget(self) -> None:
+        if self.total_tokens() <= self.max_tokens:
+            return
+
+        # 1) Shorten tool results outside the most recent turns, oldest first
+        recent_start = max(0, len(self.messages) - 2 * self.keep_recent_turns)
+        for index in range(recent_start):
+            if self._shorten_tool_results(index) and self.total_tokens() <= self.max_tokens:
+                return
+
+        # 2) Drop the oldest exchanges; history must still start with a user query
+        while self.total_tokens() > self.max_tokens:
+            next_query = next(
+                (index for index in range(1, len(self.messages)) if self._is_query(index)), None
+            )
+            if next_query is None:
+                # Only the exchange in progress is left
+                break
+            del self.messages[:next_query]
+            del self._tokens[:next_query]
+
+    # ----------------------------
+    # API view
+    # ----------------------------
+    def to_api(self) -> List[dict]:
+        """Return the messages to send, with a prompt-cache breakpoint on the newest block."""
+        return cache_message_prefix(self.messages)
@@ -3,10 +3,25 @@ import json
 import os
 from typing import List
 from mcp.server.fastmcp import FastMCP
+from paper_store import PaperStore, topic_dir_name
+from query_cache import QueryCache, make_query_key
 
 
 PAPER_DIR = "papers"
 
+# Shared storage for all tools; loads the paper ID index once
+store = PaperStore(PAPER_DIR)
+
+# One arXiv client per server process, so its rate limiter and HTTP session are reused
+arxiv_client = arxiv.Client()
+
+# Recent search results, so repeating a search skips the round trip to arXiv
+query_cache = QueryCache(
+    os.path.join(PAPER_DIR, "query_cache.json"),
+    ttl_seconds=float(os.getenv("ARXIV_CACHE_TTL_SECONDS", "3600")),
+    max_entries=int(os.getenv("ARXIV_CACHE_MAX_ENTRIES", "256")),
+)
+
 # Initialize FastMCP server
 mcp = FastMCP("research")
 
@@ -24,33 +39,26 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
         List of paper IDs found in the search
     """
     
-    # Use arxiv to find the papers 
-    client = arxiv.Client()
-
+    sort_by = arxiv.SortCriterion.Relevance
+    
+    # Reuse a recent identical search as long as its papers are still stored
+    cache_key = make_query_key(topic, max_results, sort_by.value)
+    cached_ids = query_cache.get(cache_key)
+    if cached_ids is not None and all(store.has_paper(paper_id) for paper_id in cached_ids):
+        return cached_ids
+    
     # Search for the most relevant articles matching the queried topic
     search = arxiv.Search(
         query = topic,
         max_results = max_results,
-        sort_by = arxiv.SortCriterion.Relevance
+        sort_by = sort_by
     )
 
-    papers = client.results(search)
-    
-    # Create directory for this topic
-    path = os.path.join(PAPER_DIR, topic.lower().replace(" ", "_"))
-    os.makedirs(path, exist_ok=True)
+    papers = arxiv_client.results(search)
     
-    file_path = os.path.join(path, "papers_info.json")
-
-    # Try to load existing papers info
-    try:
-        with open(file_path, "r") as json_file:
-            papers_info = json.load(json_file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        papers_info = {}
-
-    # Process each paper and add to papers_info  
+    # Process each paper and collect its info
     paper_ids = []
+    papers_info = {}
     for paper in papers:
         paper_ids.append(paper.get_short_id())
         paper_info = {
@@ -62,12 +70,13 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
         }
         papers_info[paper.get_short_id()] = paper_info
     
-    # Save updated papers_info to json file
-    with open(file_path, "w") as json_file:
-        json.dump(papers_info, json_file, indent=2)
+    # Append the new papers to this topic's log
+    file_path = store.add_papers(topic_dir_name(topic), papers_info)
     
     print(f"Results are saved in: {file_path}")
     
+    query_cache.put(cache_key, paper_ids)
+    
     return paper_ids
 
 @mcp.tool()
@@ -82,19 +91,9 @@ def extract_info(paper_id: str) -> str:
         JSON string with paper information if found, error message if not found
     """
  
-    for item in os.listdir(PAPER_DIR):
-        item_path = os.path.join(PAPER_DIR, item)
-        if os.path.isdir(item_path):
-            file_path = os.path.join(item_path, "papers_info.json")
-            if os.path.isfile(file_path):
-                try:
-                    with open(file_path, "r") as json_file:
-                        papers_info = json.load(json_file)
-                        if paper_id in papers_info:
-                            return json.dumps(papers_info[paper_id], indent=2)
-                except (FileNotFoundError, json.JSONDecodeError) as e:
-                    print(f"Error reading {file_path}: {str(e)}")
-                    continue
+    paper_info = store.get_paper(paper_id)
+    if paper_info is not None:
+        return json.dumps(paper_info, indent=2)
     
     return f"There's no saved information related to paper {paper_id}."
 
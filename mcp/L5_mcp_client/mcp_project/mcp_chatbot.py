@@ -1,12 +1,10 @@
 from dotenv import load_dotenv
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
 from typing import List
+from prompt_cache import CacheUsage, cache_message_prefix, cache_tool_definitions
 import asyncio
-import nest_asyncio
-
-nest_asyncio.apply()
 
 load_dotenv()
 
@@ -15,15 +13,24 @@ class MCP_ChatBot:
     def __init__(self):
         # Initialize session and client objects
         self.session: ClientSession = None
-        self.anthropic = Anthropic()
+        self.anthropic = AsyncAnthropic()
         self.available_tools: List[dict] = []
+        # Prompt-cache hits and misses of every model call
+        self.cache_usage = CacheUsage()
+
+    async def create_message(self, messages):
+        """Stream a completion so the event loop keeps serving the MCP session meanwhile."""
+        async with self.anthropic.messages.stream(max_tokens = 2024,
+                                      model = 'claude-3-7-sonnet-20250219', 
+                                      tools = cache_tool_definitions(self.available_tools),
+                                      messages = cache_message_prefix(messages)) as stream:
+            response = await stream.get_final_message()
+        print(CacheUsage.describe(self.cache_usage.record(response.usage)))
+        return response
 
     async def process_query(self, query):
         messages = [{'role':'user', 'content':query}]
-        response = self.anthropic.messages.create(max_tokens = 2024,
-                                      model = 'claude-3-7-sonnet-20250219', 
-                                      tools = self.available_tools,
-                                      messages = messages)
+        response = await self.create_message(messages)
         process_query = True
         while process_query:
             assistant_content = []
@@ -54,10 +61,7 @@ class MCP_ChatBot:
                                           }
                                       ]
                                     })
-                    response = self.anthropic.messages.create(max_tokens = 2024,
-                                      model = 'claude-3-7-sonnet-20250219', 
-                                      tools = self.available_tools,
-                                      messages = messages) 
+                    response = await self.create_message(messages)
                     
                     if(len(response.content) == 1 and response.content[0].type == "text"):
                         print(response.content[0].text)
@@ -72,7 +76,8 @@ class MCP_ChatBot:
         
         while True:
             try:
-                query = input("\nQuery: ").strip()
+                # Read input on a worker thread so the event loop is never blocked
+                query = (await asyncio.to_thread(input, "\nQuery: ")).strip()
         
                 if query.lower() == 'quit':
                     break
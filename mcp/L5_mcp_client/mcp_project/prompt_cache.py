@@ -0,0 +1,75 @@
+from typing import List
+
+
+def cache_tool_definitions(tools: List[dict]) -> List[dict]:
+    """
+    Return the tool list with a prompt-cache breakpoint after the last tool.
+
+    Tool definitions are rendered first in every request, so marking the end
+    of the list lets every later call in the tool loop read them from the cache.
+    """
+    if not tools:
+        return tools
+    return tools[:-1] + [{**tools[-1], "cache_control": {"type": "ephemeral"}}]
+
+
+def cache_message_prefix(messages: List[dict]) -> List[dict]:
+    """
+    Return the messages with a prompt-cache breakpoint on the newest block.
+
+    Everything up to the breakpoint is cached, so the next request in the
+    same exchange only pays full price for what was appended after it.
+    """
+    messages = list(messages)
+    if messages:
+        last = dict(messages[-1])
+        content = last["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        content = list(content)
+        content[-1] = {**as_block(content[-1]), "cache_control": {"type": "ephemeral"}}
+        last["content"] = content
+        messages[-1] = last
+    return messages
+
+
+def as_block(block) -> dict:
+    """Convert an Anthropic or MCP content block into a plain dict the API accepts."""
+    if isinstance(block, dict):
+        return block
+    if hasattr(block, "model_dump"):
+        return block.model_dump(exclude_none=True)
+    return {"type": "text", "text": str(block)}
+
+
+class CacheUsage:
+    """Per-turn prompt-cache accounting built from each response's `usage` block."""
+
+    def __init__(self):
+        self.turns: List[dict] = []
+
+    def record(self, usage) -> dict:
+        """Record one response's usage and return the turn's token counts."""
+        turn = {
+            # Read from the cache (hits)
+            "cache_read": getattr(usage, "cache_read_input_tokens", None) or 0,
+            # Written to the cache on this call (misses that later turns can reuse)
+            "cache_write": getattr(usage, "cache_creation_input_tokens", None) or 0,
+            # After the last breakpoint, never cached
+            "uncached": usage.input_tokens,
+            "output": usage.output_tokens,
+        }
+        self.turns.append(turn)
+        return turn
+
+    def totals(self) -> dict:
+        keys = ("cache_read", "cache_write", "uncached", "output")
+        return {key: sum(turn[key] for turn in self.turns) for key in keys}
+
+    @staticmethod
+    def describe(turn: dict) -> str:
+        prompt_tokens = turn["cache_read"] + turn["cache_write"] + turn["uncached"]
+        hit_rate = turn["cache_read"] / prompt_tokens if prompt_tokens else 0.0
+        return (f"[cache] {prompt_tokens} input tokens: {turn['cache_read']} read, "
+                f"{turn['cache_write']} written, {turn['uncached']} uncached "
+                f"({hit_rate:.0%} hit rate); {turn['output']} output tokens")
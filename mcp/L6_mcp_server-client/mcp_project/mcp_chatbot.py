@@ -1,15 +1,23 @@
 
 from dotenv import load_dotenv
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
+from conversation import Conversation
+from prompt_cache import CacheUsage, cache_tool_definitions
 from typing import List, Dict, TypedDict
-from contextlib import AsyncExitStack
 import json
 import asyncio
+import time
 
 load_dotenv()
 
+# Maximum number of tool calls in flight on a single MCP session at once
+MAX_CONCURRENT_CALLS_PER_SESSION = 4
+# Seconds a server may take to start and list its tools; a server entry in
+# server_config.json can override this with "startup_timeout"
+SERVER_STARTUP_TIMEOUT = 30
+
 class ToolDefinition(TypedDict):
     name: str
     description: str
@@ -17,103 +25,173 @@ class ToolDefinition(TypedDict):
 
 class MCP_ChatBot:
 
-    def __init__(self):
+    def __init__(self, stream_output: bool = True):
+        # Print text as it is generated instead of once the response is complete
+        self.stream_output = stream_output
         # Initialize session and client objects
         self.sessions: List[ClientSession] = [] # new
-        self.exit_stack = AsyncExitStack() # new
-        self.anthropic = Anthropic()
+        # One task per server, holding its connection open until cleanup
+        self.server_tasks: List[asyncio.Task] = []
+        self.shutdown = asyncio.Event()
+        # Seconds each server took from launch until its tools were listed
+        self.ready_times: Dict[str, float] = {}
+        self.anthropic = AsyncAnthropic()
+        # History shared by every query in this chat session
+        self.conversation = Conversation()
+        # Prompt-cache hits and misses of every model call
+        self.cache_usage = CacheUsage()
         self.available_tools: List[ToolDefinition] = [] # new
         self.tool_to_session: Dict[str, ClientSession] = {} # new
+        # Semaphores that cap concurrent tool calls per session
+        self.session_limits: Dict[ClientSession, asyncio.Semaphore] = {}
+
 
+    async def serve_connection(self, server_name: str, server_config: dict, ready: asyncio.Future) -> None:
+        """Open one server connection, report its tools and hold it open until cleanup.
 
-    async def connect_to_server(self, server_name: str, server_config: dict) -> None:
-        """Connect to a single MCP server."""
+        anyio requires the stdio and session contexts to be exited by the task
+        that entered them, so each server gets its own task, which is also what
+        lets the servers start concurrently.
+        """
         try:
             server_params = StdioServerParameters(**server_config)
-            stdio_transport = await self.exit_stack.enter_async_context(
-                stdio_client(server_params)
-            ) # new
-            read, write = stdio_transport
-            session = await self.exit_stack.enter_async_context(
-                ClientSession(read, write)
-            ) # new
-            await session.initialize()
-            self.sessions.append(session)
-            
-            # List available tools for this session
-            response = await session.list_tools()
-            tools = response.tools
-            print(f"\nConnected to {server_name} with tools:", [t.name for t in tools])
-            
-            for tool in tools: # new
-                self.tool_to_session[tool.name] = session
-                self.available_tools.append({
-                    "name": tool.name,
-                    "description": tool.description,
-                    "input_schema": tool.inputSchema
-                })
+            async with stdio_client(server_params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    response = await session.list_tools()
+                    ready.set_result((session, response.tools))
+                    await self.shutdown.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"Connection to {server_name} closed: {e}")
+
+    async def connect_to_server(self, server_name: str, server_config: dict):
+        """Connect to a single MCP server; returns (session, tools) or None on failure."""
+        config = dict(server_config)
+        timeout = config.pop("startup_timeout", SERVER_STARTUP_TIMEOUT)
+        start = time.perf_counter()
+
+        ready = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(self.serve_connection(server_name, config, ready))
+        try:
+            session, tools = await asyncio.wait_for(ready, timeout)
+        except asyncio.TimeoutError:
+            task.cancel()
+            print(f"Failed to connect to {server_name}: not ready after {timeout}s")
+            return None
         except Exception as e:
             print(f"Failed to connect to {server_name}: {e}")
+            return None
+
+        self.server_tasks.append(task)
+        self.ready_times[server_name] = time.perf_counter() - start
+        print(f"\nConnected to {server_name} in {self.ready_times[server_name]:.2f}s with tools:", [t.name for t in tools])
+        return session, tools
 
     async def connect_to_servers(self): # new
-        """Connect to all configured MCP servers."""
+        """Connect to all configured MCP servers concurrently."""
         try:
             with open("server_config.json", "r") as file:
                 data = json.load(file)
             
             servers = data.get("mcpServers", {})
-            
-            for server_name, server_config in servers.items():
-                await self.connect_to_server(server_name, server_config)
         except Exception as e:
             print(f"Error loading server configuration: {e}")
             raise
+
+        # A slow or broken server only costs its own timeout, not everyone's
+        results = await asyncio.gather(
+            *(self.connect_to_server(name, config) for name, config in servers.items())
+        )
+
+        # Register in config order so the tool list is stable across starts
+        for result in results:
+            if result is None:
+                continue
+            session, tools = result
+            self.sessions.append(session)
+            for tool in tools: # new
+                self.tool_to_session[tool.name] = session
+                self.available_tools.append({
+                    "name": tool.name,
+                    "description": tool.description,
+                    "input_schema": tool.inputSchema
+                })
     
+    async def call_tool(self, content) -> dict:
+        """Run one tool_use block and return its tool_result content block."""
+        tool_id = content.id
+        tool_args = content.input
+        tool_name = content.name
+        
+        print(f"Calling tool {tool_name} with args {tool_args}")
+        
+        session = self.tool_to_session.get(tool_name)
+        if not session:
+            return {"type": "tool_result",
+                    "tool_use_id": tool_id,
+                    "content": f"Tool '{tool_name}' not found.",
+                    "is_error": True}
+        
+        limit = self.session_limits.setdefault(
+            session, asyncio.Semaphore(MAX_CONCURRENT_CALLS_PER_SESSION)
+        )
+        try:
+            async with limit:
+                result = await session.call_tool(tool_name, arguments=tool_args)
+        except Exception as e:
+            return {"type": "tool_result",
+                    "tool_use_id": tool_id,
+                    "content": f"Error calling tool '{tool_name}': {e}",
+                    "is_error": True}
+        return {"type": "tool_result",
+                "tool_use_id": tool_id,
+                "content": result.content}
+
     async def process_query(self, query):
-        messages = [{'role':'user', 'content':query}]
-        response = self.anthropic.messages.create(max_tokens = 2024,
-                                      model = 'claude-3-7-sonnet-20250219', 
-                                      tools = self.available_tools,
-                                      messages = messages)
-        process_query = True
-        while process_query:
-            assistant_content = []
-            for content in response.content:
-                if content.type =='text':
-                    print(content.text)
-                    assistant_content.append(content)
-                    if(len(response.content) == 1):
-                        process_query= False
-                elif content.type == 'tool_use':
-                    assistant_content.append(content)
-                    messages.append({'role':'assistant', 'content':assistant_content})
-                    tool_id = content.id
-                    tool_args = content.input
-                    tool_name = content.name
-                    
-    
-                    print(f"Calling tool {tool_name} with args {tool_args}")
-                    
-                    # Call a tool
-                    session = self.tool_to_session[tool_name] # new
-                    result = await session.call_tool(tool_name, arguments=tool_args)
-                    messages.append({"role": "user", 
-                                      "content": [
-                                          {
-                                              "type": "tool_result",
-                                              "tool_use_id":tool_id,
-                                              "content": result.content
-                                          }
-                                      ]
-                                    })
-                    response = self.anthropic.messages.create(max_tokens = 2024,
-                                      model = 'claude-3-7-sonnet-20250219', 
-                                      tools = self.available_tools,
-                                      messages = messages) 
-                    
-                    if(len(response.content) == 1 and response.content[0].type == "text"):
-                        print(response.content[0].text)
-                        process_query= False
+        self.conversation.add_user_query(query)
+        while True:
+            tool_calls: List[asyncio.Task] = []
+            start = time.perf_counter()
+            first_token_at = None
+            # Stream the completion so the event loop (and every MCP session)
+            # keeps running while the model is generating
+            async with self.anthropic.messages.stream(max_tokens = 2024,
+                                          model = 'claude-3-7-sonnet-20250219', 
+                                          tools = cache_tool_definitions(self.available_tools),
+                                          messages = self.conversation.to_api()) as stream:
+                async for event in stream:
+                    if event.type in ('text', 'input_json') and first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    if event.type == 'text' and self.stream_output:
+                        print(event.text, end="", flush=True)
+                    elif event.type == 'content_block_stop' and event.content_block.type == 'tool_use':
+                        # Start each tool as soon as its input is complete
+                        tool_calls.append(asyncio.create_task(self.call_tool(event.content_block)))
+                response = await stream.get_final_message()
+            end = time.perf_counter()
+
+            if self.stream_output:
+                print()
+            else:
+                for content in response.content:
+                    if content.type =='text':
+                        print(content.text)
+            if first_token_at is not None:
+                tokens_per_second = response.usage.output_tokens / max(end - first_token_at, 1e-6)
+                print(f"[stream] time to first token {first_token_at - start:.2f}s, "
+                      f"{tokens_per_second:.1f} tokens/s")
+            print(CacheUsage.describe(self.cache_usage.record(response.usage)))
+            self.conversation.add_assistant(response.content)
+            
+            if not tool_calls:
+                break
+            
+            # The calls were started in tool_use order; gather keeps that order
+            tool_results = await asyncio.gather(*tool_calls)
+            self.conversation.add_tool_results(list(tool_results))
 
     
     
@@ -124,7 +202,8 @@ class MCP_ChatBot:
         
         while True:
             try:
-                query = input("\nQuery: ").strip()
+                # Read input on a worker thread so the event loop is never blocked
+                query = (await asyncio.to_thread(input, "\nQuery: ")).strip()
         
                 if query.lower() == 'quit':
                     break
@@ -136,8 +215,9 @@ class MCP_ChatBot:
                 print(f"\nError: {str(e)}")
     
     async def cleanup(self): # new
-        """Cleanly close all resources using AsyncExitStack."""
-        await self.exit_stack.aclose()
+        """Signal every connection task to close its contexts and wait for them."""
+        self.shutdown.set()
+        await asyncio.gather(*self.server_tasks, return_exceptions=True)
 
 
 async def main():
@@ -0,0 +1,275 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+INDEX_FILE = "index.jsonl"
+TOPIC_LOG = "papers.jsonl"
+LEGACY_FILE = "papers_info.json"
+
+# Compact a log once it holds this many times more lines than live records...
+COMPACT_RATIO = 2
+# ...but never bother for logs shorter than this
+COMPACT_MIN_LINES = 64
+
+
+def topic_dir_name(topic: str) -> str:
+    """Normalise a topic into the directory name used on disk."""
+    return topic.lower().replace(" ", "_")
+
+
+def _write_atomic(path: str, lines: List[str]) -> None:
+    """Write lines to a temp file and rename it over `path`, so readers never see a partial file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.writelines(lines)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _repair_tail(path: str) -> None:
+    """Truncate a torn final line left behind by a crash in the middle of an append."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        # Walk backwards to the end of the last complete line
+        pos = size - 1
+        while pos > 0:
+            step = min(4096, pos)
+            f.seek(pos - step)
+            newline = f.read(step).rfind(b"\n")
+            if newline != -1:
+                pos = pos - step + newline + 1
+                break
+            pos -= step
+        f.truncate(pos)
+
+
+def _append(path: str, lines: List[str]) -> List[int]:
+    """Durably append lines to a JSON Lines journal and return the byte offset of each."""
+    _repair_tail(path)
+    offsets = []
+    with open(path, "ab") as f:
+        for line in lines:
+            offsets.append(f.tell())
+            f.write(line.encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    return offsets
+
+
+class PaperStore:
+    """
+    Append-only paper storage shared by the research server tools and resources.
+
+    Layout under `root`:
+        <topic>/papers.jsonl   one JSON record per line: {"id": ..., **paper_info}
+        index.jsonl            one line per write: {"id": ..., "topic": ..., "offset": ...}
+
+    The index is loaded into memory once, so looking up a paper by ID is a
+    dict hit plus a single seek + readline in the topic log. New search
+    results are appended to both journals, so a write costs the size of the
+    batch rather than the size of the topic. Superseded records are dropped
+    by compaction, which rewrites a journal through a temp file + rename.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.index_path = os.path.join(root, INDEX_FILE)
+        # paper_id -> topic of its most recent write
+        self._latest: Dict[str, str] = {}
+        # topic -> {paper_id: byte offset of its live record in <topic>/papers.jsonl}
+        self._offsets: Dict[str, Dict[str, int]] = {}
+        # topic -> number of lines in its log, including superseded records
+        self._log_lines: Dict[str, int] = {}
+        self._index_lines = 0
+        # number of live (topic, paper) records across all topics
+        self._live_records = 0
+
+        os.makedirs(root, exist_ok=True)
+        if os.path.exists(self.index_path):
+            self._load_index()
+        else:
+            self._migrate_legacy()
+
+    # ----------------------------
+    # Index bookkeeping
+    # ----------------------------
+    def _load_index(self) -> None:
+        _repair_tail(self.index_path)
+        with open(self.index_path, "r") as f:
+            for line in f:
+                entry = json.loads(line)
+                self._remember(entry["id"], entry["topic"], entry["offset"])
+
+    def _remember(self, paper_id: str, topic: str, offset: int) -> None:
+        # The most recent write wins when the same paper is stored under several topics
+        self._latest[paper_id] = topic
+        offsets = self._offsets.setdefault(topic, {})
+        if paper_id not in offsets:
+            self._live_records += 1
+        offsets[paper_id] = offset
+        self._log_lines[topic] = self._log_lines.get(topic, 0) + 1
+        self._index_lines += 1
+
+    def _rewrite_index(self) -> None:
+        """Atomically replace the index with one line per live (topic, paper) record."""
+        lines = []
+        latest_lines = []
+        for topic, offsets in self._offsets.items():
+            for paper_id, offset in offsets.items():
+                line = json.dumps({"id": paper_id, "topic": topic, "offset": offset}) + "\n"
+                # Emit each paper's most recent topic last so it still wins on reload
+                if self._latest.get(paper_id) == topic:
+                    latest_lines.append(line)
+                else:
+                    lines.append(line)
+        _write_atomic(self.index_path, lines + latest_lines)
+        self._index_lines = len(lines) + len(latest_lines)
+
+    def _write_topic(self, topic: str, papers_info: Dict[str, dict]) -> None:
+        """Atomically replace a topic log with exactly `papers_info` and update its offsets."""
+        path = os.path.join(self.root, topic)
+        os.makedirs(path, exist_ok=True)
+
+        lines = []
+        offsets = {}
+        position = 0
+        for paper_id, paper_info in papers_info.items():
+            line = json.dumps({"id": paper_id, **paper_info}) + "\n"
+            offsets[paper_id] = position
+            position += len(line.encode("utf-8"))
+            lines.append(line)
+            self._latest.setdefault(paper_id, topic)
+
+        _write_atomic(os.path.join(path, TOPIC_LOG), lines)
+        self._live_records += len(offsets) - len(self._offsets.get(topic, {}))
+        self._offsets[topic] = offsets
+        self._log_lines[topic] = len(lines)
+
+    def _migrate_legacy(self) -> None:
+        """Import any existing <topic>/papers_info.json files into the journal layout."""
+        for topic in sorted(os.listdir(self.root)):
+            legacy_path = os.path.join(self.root, topic, LEGACY_FILE)
+            if not os.path.isfile(legacy_path):
+                continue
+            try:
+                with open(legacy_path, "r") as json_file:
+                    papers_info = json.load(json_file)
+            except json.JSONDecodeError as e:
+                print(f"Error reading {legacy_path}: {str(e)}")
+                continue
+            self._write_topic(topic, papers_info)
+        # The index is written last, so an interrupted migration simply reruns
+        self._rewrite_index()
+
+    def _maybe_compact(self, topic: str) -> None:
+        log_lines = self._log_lines[topic]
+        if log_lines >= COMPACT_MIN_LINES and log_lines > COMPACT_RATIO * len(self._offsets[topic]):
+            self.compact(topic)
+        elif self._index_lines >= COMPACT_MIN_LINES and self._index_lines > COMPACT_RATIO * self._live_records:
+            self._rewrite_index()
+
+    # ----------------------------
+    # Public API
+    # ----------------------------
+    def add_papers(self, topic: str, papers_info: Dict[str, dict]) -> str:
+        """
+        Append papers to a topic log and record their offsets in the index.
+
+        Args:
+            topic: Topic directory name (already normalised)
+            papers_info: Mapping of paper ID to paper information
+
+        Returns:
+            Path of the topic log the papers were written to
+        """
+        path = os.path.join(self.root, topic)
+        os.makedirs(path, exist_ok=True)
+        log_path = os.path.join(path, TOPIC_LOG)
+
+        paper_ids = list(papers_info)
+        records = [json.dumps({"id": paper_id, **papers_info[paper_id]}) + "\n" for paper_id in paper_ids]
+        # The log is made durable before the index, so the index never points past the log
+        offsets = _append(log_path, records)
+
+        entries = [
+            json.dumps({"id": paper_id, "topic": topic, "offset": offset}) + "\n"
+            for paper_id, offset in zip(paper_ids, offsets)
+        ]
+        _append(self.index_path, entries)
+        for paper_id, offset in zip(paper_ids, offsets):
+            self._remember(paper_id, topic, offset)
+
+        self._maybe_compact(topic)
+        return log_path
+
+    def compact(self, topic: str) -> None:
+        """Rewrite a topic log keeping only the latest record for each paper."""
+        papers_info = self.get_topic_papers(topic)
+        if papers_info is None:
+            return
+        self._write_topic(topic, papers_info)
+        self._rewrite_index()
+
+    def has_paper(self, paper_id: str) -> bool:
+        """Return True if a paper ID is stored under any topic."""
+        return paper_id in self._latest
+
+    def get_paper(self, paper_id: str) -> Optional[dict]:
+        """Return the stored information for a paper ID, or None if unknown."""
+        topic = self._latest.get(paper_id)
+        if topic is None:
+            return None
+        offset = self._offsets[topic][paper_id]
+        with open(self.topic_log_path(topic), "rb") as log_file:
+            log_file.seek(offset)
+            line = log_file.readline()
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            record = {}
+        if record.get("id") != paper_id:
+            # A crash between a compaction's log rename and its index rewrite
+            # leaves stale offsets; rebuild this topic from its log instead.
+            self.compact(topic)
+            return (self.get_topic_papers(topic) or {}).get(paper_id)
+        record.pop("id")
+        return record
+
+    def topic_log_path(self, topic: str) -> str:
+        """Return the path of a topic's log (which may not exist yet)."""
+        return os.path.join(self.root, topic, TOPIC_LOG)
+
+    def list_topics(self) -> List[str]:
+        """Return the topics that currently hold at least one paper."""
+        return sorted(topic for topic, offsets in self._offsets.items() if offsets)
+
+    def get_topic_papers(self, topic: str) -> Optional[Dict[str, dict]]:
+        """
+        Return every paper stored for a topic, keyed by paper ID.
+
+        Returns None if the topic has never been written.
+        """
+        log_path = self.topic_log_path(topic)
+        if not os.path.exists(log_path):
+            return None
+        papers: Dict[str, dict] = {}
+        with open(log_path, "r") as log_file:
+            for line in log_file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Only a torn final line can fail to parse; it is repaired on the next append
+                    continue
+                paper_id = record.pop("id")
+                # Later records for the same ID supersede earlier ones
+                papers[paper_id] = record
+        return papers
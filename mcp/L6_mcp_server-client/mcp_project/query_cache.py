@@ -0,0 +1,62 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+
+def make_query_key(topic: str, max_results: int, sort_by: str) -> str:
+    """Build a cache key from a search, ignoring case and repeated whitespace in the topic."""
+    normalised = " ".join(topic.lower().split())
+    return f"{normalised}|{max_results}|{sort_by}"
+
+
+class QueryCache:
+    """
+    Persistent cache of arXiv search results (the paper IDs a query returned).
+
+    Entries expire after `ttl_seconds`. When more than `max_entries` are held,
+    the oldest ones are evicted. The cache is saved as a single JSON file
+    through a temp file + rename, so it survives server restarts.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 3600, max_entries: int = 256):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # key -> {"paper_ids": [...], "created": unix timestamp}, oldest first
+        self._entries: Dict[str, dict] = {}
+
+        try:
+            with open(path, "r") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entries = {}
+        now = time.time()
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["created"]):
+            if now - entry["created"] < ttl_seconds:
+                self._entries[key] = entry
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Return the cached paper IDs for a query, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["created"] >= self.ttl_seconds:
+            del self._entries[key]
+            return None
+        return entry["paper_ids"]
+
+    def put(self, key: str, paper_ids: List[str]) -> None:
+        """Store the paper IDs returned by a query and persist the cache."""
+        self._entries.pop(key, None)
+        self._entries[key] = {"paper_ids": paper_ids, "created": time.time()}
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+        self._save()
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
@@ -1,138 +1,387 @@
 from dotenv import load_dotenv
-from anthropic import Anthropic
-from mcp import ClientSession, StdioServerParameters
+from anthropic import AsyncAnthropic
+from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
-from contextlib import AsyncExitStack
+from conversation import Conversation
+from prompt_cache import CacheUsage, cache_tool_definitions
+import hashlib
 import json
+import os
 import asyncio
-import nest_asyncio
-
-nest_asyncio.apply()
+import time
 
 load_dotenv()
 
+# Maximum number of tool calls in flight on a single MCP session at once
+MAX_CONCURRENT_CALLS_PER_SESSION = 4
+# Seconds a server may take to start and list its capabilities; a server
+# entry in server_config.json can override this with "startup_timeout"
+SERVER_STARTUP_TIMEOUT = 30
+# Tools, prompts and resources of each server, reused across chatbot starts
+CAPABILITY_CACHE_FILE = "capability_cache.json"
+
+LIST_CHANGED_NOTIFICATIONS = (
+    types.ToolListChangedNotification,
+    types.PromptListChangedNotification,
+    types.ResourceListChangedNotification,
+)
+
+
+def config_hash(server_name, server_config):
+    """Key a server's cached catalogue by its name and launch configuration."""
+    payload = json.dumps({"name": server_name, "config": server_config}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 class MCP_ChatBot:
-    def __init__(self):
-        self.exit_stack = AsyncExitStack()
-        self.anthropic = Anthropic()
+    def __init__(self, stream_output=True):
+        # Print text as it is generated instead of once the response is complete
+        self.stream_output = stream_output
+        # One task per connected server; each holds its connection open until cleanup
+        self.server_tasks = []
+        self.shutdown = asyncio.Event()
+        # Seconds each server took from launch until its capabilities were listed
+        self.ready_times = {}
+        self.anthropic = AsyncAnthropic()
+        # History shared by every query in this chat session
+        self.conversation = Conversation()
+        # Prompt-cache hits and misses of every model call
+        self.cache_usage = CacheUsage()
         # Tools list required for Anthropic API
         self.available_tools = []
         # Prompts list for quick display 
         self.available_prompts = []
         # Sessions dict maps tool/prompt names or resource URIs to MCP client sessions
         self.sessions = {}
+        # Server that provides each tool/prompt name or resource URI, connected or not
+        self.capability_owner = {}
+        # Per-server catalogue: {"version", "tools", "prompts", "resources"}
+        self.catalogues = {}
+        # Launch configuration and live session of each server, by name
+        self.server_configs = {}
+        self.server_sessions = {}
+        # Task per server that finishes once it has connected (or failed to)
+        self.server_ready = {}
+        # Semaphores that cap concurrent tool calls per session
+        self.session_limits = {}
+        # Background re-listings of servers started from a cached catalogue
+        self.refresh_tasks = set()
 
-    async def connect_to_server(self, server_name, server_config):
+    async def serve_connection(self, server_name, server_config, cached_version, ready):
+        """
+        Open one server connection, report its capabilities and hold it until cleanup.
+
+        anyio requires the stdio and session contexts to be exited by the task
+        that entered them, so each server lives in its own task. That is also
+        what lets several servers start at the same time.
+        """
+        async def handle_message(message):
+            # Re-list from a separate task; awaiting a request inside the
+            # session's receive loop would deadlock it
+            if isinstance(message, types.ServerNotification) and isinstance(
+                message.root, LIST_CHANGED_NOTIFICATIONS
+            ):
+                self.refresh_in_background(server_name)
+        
         try:
             server_params = StdioServerParameters(**server_config)
-            stdio_transport = await self.exit_stack.enter_async_context(
-                stdio_client(server_params)
-            )
-            read, write = stdio_transport
-            session = await self.exit_stack.enter_async_context(
-                ClientSession(read, write)
-            )
-            await session.initialize()
-            
-            
+            async with stdio_client(server_params) as (read, write):
+                async with ClientSession(read, write, message_handler=handle_message) as session:
+                    init_result = await session.initialize()
+                    version = init_result.serverInfo.version
+                    # With the same version the cached catalogue is used straight
+                    # away and re-checked in the background once connected
+                    listings = None
+                    if version != cached_version:
+                        listings = await self.list_capabilities(session)
+                    ready.set_result((session, version, listings))
+                    await self.shutdown.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"Connection to {server_name} closed: {e}")
+
+    async def list_capabilities(self, session):
+        """List a session's tools, prompts and resources concurrently."""
+        # Servers may not implement prompts or resources, so keep going if
+        # one of the listings fails
+        return await asyncio.gather(
+            session.list_tools(),
+            session.list_prompts(),
+            session.list_resources(),
+            return_exceptions=True
+        )
+
+    def build_catalogue(self, server_name, version, tools, prompts, resources):
+        """Turn a server's list_* responses into a JSON-serialisable catalogue."""
+        for listing in (tools, prompts, resources):
+            if isinstance(listing, Exception):
+                print(f"Error listing capabilities of {server_name}: {listing}")
+        
+        catalogue = {"version": version, "tools": [], "prompts": [], "resources": []}
+        if not isinstance(tools, Exception):
+            for tool in tools.tools:
+                catalogue["tools"].append({
+                    "name": tool.name,
+                    "description": tool.description,
+                    "input_schema": tool.inputSchema
+                })
+        if not isinstance(prompts, Exception) and prompts and prompts.prompts:
+            for prompt in prompts.prompts:
+                catalogue["prompts"].append({
+                    "name": prompt.name,
+                    "description": prompt.description,
+                    "arguments": [
+                        {"name": arg.name, "description": arg.description, "required": arg.required}
+                        for arg in prompt.arguments or []
+                    ]
+                })
+        if not isinstance(resources, Exception) and resources and resources.resources:
+            for resource in resources.resources:
+                catalogue["resources"].append(str(resource.uri))
+        return catalogue
+
+    def rebuild_capabilities(self):
+        """Rebuild the tool/prompt lists and session lookups from every catalogue, in config order."""
+        self.available_tools = []
+        self.available_prompts = []
+        self.capability_owner = {}
+        for server_name in self.server_configs:
+            catalogue = self.catalogues.get(server_name)
+            if catalogue is None:
+                continue
+            for tool in catalogue["tools"]:
+                self.capability_owner[tool["name"]] = server_name
+                self.available_tools.append(tool)
+            for prompt in catalogue["prompts"]:
+                self.capability_owner[prompt["name"]] = server_name
+                self.available_prompts.append(prompt)
+            for resource_uri in catalogue["resources"]:
+                self.capability_owner[resource_uri] = server_name
+        self.sessions = {
+            name: self.server_sessions[server_name]
+            for name, server_name in self.capability_owner.items()
+            if server_name in self.server_sessions
+        }
+
+    def load_capability_cache(self):
+        """Adopt cached catalogues whose server configuration is unchanged."""
+        try:
+            with open(CAPABILITY_CACHE_FILE, "r") as file:
+                cache = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        for server_name, server_config in self.server_configs.items():
+            catalogue = cache.get(config_hash(server_name, server_config))
+            if catalogue is not None:
+                self.catalogues[server_name] = catalogue
+
+    def save_capability_cache(self):
+        cache = {
+            config_hash(server_name, server_config): self.catalogues[server_name]
+            for server_name, server_config in self.server_configs.items()
+            if server_name in self.catalogues
+        }
+        tmp_path = CAPABILITY_CACHE_FILE + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(cache, file, indent=2)
+        os.replace(tmp_path, CAPABILITY_CACHE_FILE)
+
+    async def refresh_catalogue(self, server_name):
+        """Re-list a connected server's capabilities and adopt them if they changed."""
+        session = self.server_sessions.get(server_name)
+        if session is None:
+            return
+        version = self.catalogues.get(server_name, {}).get("version")
+        listings = await self.list_capabilities(session)
+        catalogue = self.build_catalogue(server_name, version, *listings)
+        if catalogue == self.catalogues.get(server_name):
+            return
+        self.catalogues[server_name] = catalogue
+        self.save_capability_cache()
+        self.rebuild_capabilities()
+
+    def refresh_in_background(self, server_name):
+        """
+        Re-list a server without blocking the caller; the task is kept, logged and cancelled at cleanup.
+
+        Used after a list_changed notification and to check a cached catalogue
+        against the live server: FastMCP servers report the mcp SDK version
+        rather than their own and send no list_changed on startup, so an edited
+        server would otherwise keep its stale cached catalogue.
+        """
+        async def refresh():
             try:
-                # List available tools
-                response = await session.list_tools()
-                for tool in response.tools:
-                    self.sessions[tool.name] = session
-                    self.available_tools.append({
-                        "name": tool.name,
-                        "description": tool.description,
-                        "input_schema": tool.inputSchema
-                    })
-            
-                # List available prompts
-                prompts_response = await session.list_prompts()
-                if prompts_response and prompts_response.prompts:
-                    for prompt in prompts_response.prompts:
-                        self.sessions[prompt.name] = session
-                        self.available_prompts.append({
-                            "name": prompt.name,
-                            "description": prompt.description,
-                            "arguments": prompt.arguments
-                        })
-                # List available resources
-                resources_response = await session.list_resources()
-                if resources_response and resources_response.resources:
-                    for resource in resources_response.resources:
-                        resource_uri = str(resource.uri)
-                        self.sessions[resource_uri] = session
-            
+                await self.refresh_catalogue(server_name)
             except Exception as e:
-                print(f"Error {e}")
-                
+                print(f"Error refreshing capabilities of {server_name}: {e}")
+
+        task = asyncio.create_task(refresh())
+        self.refresh_tasks.add(task)
+        task.add_done_callback(self.refresh_tasks.discard)
+
+    async def connect_to_server(self, server_name, server_config):
+        """Start one server, refresh its catalogue if needed and return whether it connected."""
+        config = dict(server_config)
+        timeout = config.pop("startup_timeout", SERVER_STARTUP_TIMEOUT)
+        start = time.perf_counter()
+        
+        cached_version = self.catalogues.get(server_name, {}).get("version")
+        ready = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(
+            self.serve_connection(server_name, config, cached_version, ready)
+        )
+        try:
+            session, version, listings = await asyncio.wait_for(ready, timeout)
+        except asyncio.TimeoutError:
+            task.cancel()
+            print(f"Error connecting to {server_name}: not ready after {timeout}s")
+            return False
         except Exception as e:
             print(f"Error connecting to {server_name}: {e}")
+            return False
+        
+        self.server_tasks.append(task)
+        self.server_sessions[server_name] = session
+        if listings is not None:
+            self.catalogues[server_name] = self.build_catalogue(server_name, version, *listings)
+            self.save_capability_cache()
+        self.rebuild_capabilities()
+        if listings is None:
+            # Served from the cache; verify it lazily
+            self.refresh_in_background(server_name)
+        
+        self.ready_times[server_name] = time.perf_counter() - start
+        print(f"Connected to {server_name} in {self.ready_times[server_name]:.2f}s")
+        return True
 
     async def connect_to_servers(self):
         try:
             with open("server_config.json", "r") as file:
                 data = json.load(file)
-            servers = data.get("mcpServers", {})
-            for server_name, server_config in servers.items():
-                await self.connect_to_server(server_name, server_config)
+            self.server_configs = data.get("mcpServers", {})
         except Exception as e:
             print(f"Error loading server config: {e}")
             raise
+        
+        # Advertise cached capabilities straight away
+        self.load_capability_cache()
+        self.rebuild_capabilities()
+        
+        # Start every server at once; a slow or broken one only costs its own timeout
+        for server_name, server_config in self.server_configs.items():
+            self.server_ready[server_name] = asyncio.create_task(
+                self.connect_to_server(server_name, server_config)
+            )
+        
+        # Servers with a cached catalogue finish connecting in the background;
+        # only wait for the ones whose capabilities are still unknown
+        await asyncio.gather(*(
+            task for server_name, task in self.server_ready.items()
+            if server_name not in self.catalogues
+        ))
+
+    async def get_session(self, name):
+        """Return the session serving a tool/prompt/resource, waiting for its server if it is still starting."""
+        session = self.sessions.get(name)
+        if session is None and name in self.capability_owner:
+            ready = self.server_ready.get(self.capability_owner[name])
+            if ready is not None:
+                await asyncio.shield(ready)
+                session = self.sessions.get(name)
+        return session
+    
+    async def call_tool(self, content):
+        """Run one tool_use block and return its tool_result content block."""
+        session = await self.get_session(content.name)
+        if not session:
+            print(f"Tool '{content.name}' not found.")
+            return {
+                "type": "tool_result",
+                "tool_use_id": content.id,
+                "content": f"Tool '{content.name}' not found.",
+                "is_error": True
+            }
+        
+        limit = self.session_limits.setdefault(
+            session, asyncio.Semaphore(MAX_CONCURRENT_CALLS_PER_SESSION)
+        )
+        try:
+            async with limit:
+                result = await session.call_tool(content.name, arguments=content.input)
+        except Exception as e:
+            return {
+                "type": "tool_result",
+                "tool_use_id": content.id,
+                "content": f"Error calling tool '{content.name}': {e}",
+                "is_error": True
+            }
+        return {
+            "type": "tool_result",
+            "tool_use_id": content.id,
+            "content": result.content
+        }
     
     async def process_query(self, query):
-        messages = [{'role':'user', 'content':query}]
+        self.conversation.add_user_query(query)
         
         while True:
-            response = self.anthropic.messages.create(
+            tool_calls = []
+            start = time.perf_counter()
+            first_token_at = None
+            
+            # Stream the completion so the event loop (and every MCP session)
+            # keeps running while the model is generating
+            async with self.anthropic.messages.stream(
                 max_tokens = 2024,
                 model = 'claude-3-7-sonnet-20250219', 
-                tools = self.available_tools,
-                messages = messages
-            )
+                tools = cache_tool_definitions(self.available_tools),
+                messages = self.conversation.to_api()
+            ) as stream:
+                async for event in stream:
+                    if event.type in ('text', 'input_json') and first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    if event.type == 'text' and self.stream_output:
+                        print(event.text, end="", flush=True)
+                    elif event.type == 'content_block_stop' and event.content_block.type == 'tool_use':
+                        # The tool's input is complete, so start it while the
+                        # model keeps generating the rest of the response
+                        tool_calls.append(asyncio.create_task(self.call_tool(event.content_block)))
+                response = await stream.get_final_message()
+            end = time.perf_counter()
             
-            assistant_content = []
-            has_tool_use = False
+            if self.stream_output:
+                print()
+            else:
+                for content in response.content:
+                    if content.type == 'text':
+                        print(content.text)
             
-            for content in response.content:
-                if content.type == 'text':
-                    print(content.text)
-                    assistant_content.append(content)
-                elif content.type == 'tool_use':
-                    has_tool_use = True
-                    assistant_content.append(content)
-                    messages.append({'role':'assistant', 'content':assistant_content})
-                    
-                    # Get session and call tool
-                    session = self.sessions.get(content.name)
-                    if not session:
-                        print(f"Tool '{content.name}' not found.")
-                        break
-                        
-                    result = await session.call_tool(content.name, arguments=content.input)
-                    messages.append({
-                        "role": "user", 
-                        "content": [
-                            {
-                                "type": "tool_result",
-                                "tool_use_id": content.id,
-                                "content": result.content
-                            }
-                        ]
-                    })
+            if first_token_at is not None:
+                tokens_per_second = response.usage.output_tokens / max(end - first_token_at, 1e-6)
+                print(f"[stream] time to first token {first_token_at - start:.2f}s, "
+                      f"{tokens_per_second:.1f} tokens/s")
+            print(CacheUsage.describe(self.cache_usage.record(response.usage)))
+            self.conversation.add_assistant(response.content)
             
             # Exit loop if no tool was used
-            if not has_tool_use:
+            if not tool_calls:
                 break
+            
+            # The tool calls were started in tool_use order, and gather keeps
+            # that order for the results
+            tool_results = await asyncio.gather(*tool_calls)
+            self.conversation.add_tool_results(list(tool_results))
 
     async def get_resource(self, resource_uri):
-        session = self.sessions.get(resource_uri)
+        session = await self.get_session(resource_uri)
         
         # Fallback for papers URIs - try any papers resource session
         if not session and resource_uri.startswith("papers://"):
-            for uri, sess in self.sessions.items():
+            for uri in list(self.capability_owner):
                 if uri.startswith("papers://"):
-                    session = sess
+                    session = await self.get_session(uri)
                     break
             
         if not session:
@@ -167,7 +416,7 @@ class MCP_ChatBot:
     
     async def execute_prompt(self, prompt_name, args):
         """Execute a prompt with the given arguments."""
-        session = self.sessions.get(prompt_name)
+        session = await self.get_session(prompt_name)
         if not session:
             print(f"Prompt '{prompt_name}' not found.")
             return
@@ -202,7 +451,8 @@ class MCP_ChatBot:
         
         while True:
             try:
-                query = input("\nQuery: ").strip()
+                # Read input on a worker thread so the event loop is never blocked
+                query = (await asyncio.to_thread(input, "\nQuery: ")).strip()
                 if not query:
                     continue
         
@@ -252,7 +502,12 @@ class MCP_ChatBot:
                 print(f"\nError: {str(e)}")
     
     async def cleanup(self):
-        await self.exit_stack.aclose()
+        # Let every connection task leave its contexts, then wait for them
+        for task in self.refresh_tasks:
+            task.cancel()
+        self.shutdown.set()
+        await asyncio.gather(*self.server_ready.values(), return_exceptions=True)
+        await asyncio.gather(*self.server_tasks, return_exceptions=True)
 
 
 async def main():
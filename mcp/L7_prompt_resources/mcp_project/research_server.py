@@ -3,9 +3,31 @@ import json
 import os
 from typing import List
 from mcp.server.fastmcp import FastMCP
+from paper_store import PaperStore, topic_dir_name
+from query_cache import QueryCache, make_query_key
+from resource_cache import ResourceCache, file_signature
 
 PAPER_DIR = "papers"
 
+# Shared storage for all tools and resources; loads the paper ID index once
+store = PaperStore(PAPER_DIR)
+
+# One arXiv client per server process, so its rate limiter and HTTP session are reused
+arxiv_client = arxiv.Client()
+
+# Recent search results, so repeating a search skips the round trip to arXiv
+query_cache = QueryCache(
+    os.path.join(PAPER_DIR, "query_cache.json"),
+    ttl_seconds=float(os.getenv("ARXIV_CACHE_TTL_SECONDS", "3600")),
+    max_entries=int(os.getenv("ARXIV_CACHE_MAX_ENTRIES", "256")),
+)
+
+# Rendered papers:// resources, invalidated when the backing file's mtime/size changes
+resource_cache = ResourceCache(
+    max_entries=int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "128")),
+    max_bytes=int(os.getenv("RESEARCH_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+)
+
 # Initialize FastMCP server
 mcp = FastMCP("research")
 
@@ -22,33 +44,26 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
         List of paper IDs found in the search
     """
     
-    # Use arxiv to find the papers 
-    client = arxiv.Client()
-
+    sort_by = arxiv.SortCriterion.Relevance
+    
+    # Reuse a recent identical search as long as its papers are still stored
+    cache_key = make_query_key(topic, max_results, sort_by.value)
+    cached_ids = query_cache.get(cache_key)
+    if cached_ids is not None and all(store.has_paper(paper_id) for paper_id in cached_ids):
+        return cached_ids
+    
     # Search for the most relevant articles matching the queried topic
     search = arxiv.Search(
         query = topic,
         max_results = max_results,
-        sort_by = arxiv.SortCriterion.Relevance
+        sort_by = sort_by
     )
 
-    papers = client.results(search)
+    papers = arxiv_client.results(search)
     
-    # Create directory for this topic
-    path = os.path.join(PAPER_DIR, topic.lower().replace(" ", "_"))
-    os.makedirs(path, exist_ok=True)
-    
-    file_path = os.path.join(path, "papers_info.json")
-
-    # Try to load existing papers info
-    try:
-        with open(file_path, "r") as json_file:
-            papers_info = json.load(json_file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        papers_info = {}
-
-    # Process each paper and add to papers_info  
+    # Process each paper and collect its info
     paper_ids = []
+    papers_info = {}
     for paper in papers:
         paper_ids.append(paper.get_short_id())
         paper_info = {
@@ -60,12 +75,13 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
         }
         papers_info[paper.get_short_id()] = paper_info
     
-    # Save updated papers_info to json file
-    with open(file_path, "w") as json_file:
-        json.dump(papers_info, json_file, indent=2)
+    # Append the new papers to this topic's log
+    file_path = store.add_papers(topic_dir_name(topic), papers_info)
     
     print(f"Results are saved in: {file_path}")
     
+    query_cache.put(cache_key, paper_ids)
+    
     return paper_ids
 
 @mcp.tool()
@@ -80,19 +96,9 @@ def extract_info(paper_id: str) -> str:
         JSON string with paper information if found, error message if not found
     """
  
-    for item in os.listdir(PAPER_DIR):
-        item_path = os.path.join(PAPER_DIR, item)
-        if os.path.isdir(item_path):
-            file_path = os.path.join(item_path, "papers_info.json")
-            if os.path.isfile(file_path):
-                try:
-                    with open(file_path, "r") as json_file:
-                        papers_info = json.load(json_file)
-                        if paper_id in papers_info:
-                            return json.dumps(papers_info[paper_id], indent=2)
-                except (FileNotFoundError, json.JSONDecodeError) as e:
-                    print(f"Error reading {file_path}: {str(e)}")
-                    continue
+    paper_info = store.get_paper(paper_id)
+    if paper_info is not None:
+        return json.dumps(paper_info, indent=2)
     
     return f"There's no saved information related to paper {paper_id}."
 
@@ -105,16 +111,14 @@ def get_available_folders() -> str:
     
     This resource provides a simple list of all available topic folders.
     """
-    folders = []
+    # Every new topic is recorded in the index, so its signature covers the folder list
+    signature = file_signature(store.index_path)
+    cached = resource_cache.get("folders", signature)
+    if cached is not None:
+        return cached
     
-    # Get all topic directories
-    if os.path.exists(PAPER_DIR):
-        for topic_dir in os.listdir(PAPER_DIR):
-            topic_path = os.path.join(PAPER_DIR, topic_dir)
-            if os.path.isdir(topic_path):
-                papers_file = os.path.join(topic_path, "papers_info.json")
-                if os.path.exists(papers_file):
-                    folders.append(topic_dir)
+    # Topics are tracked by the store's index, so no directory walk is needed
+    folders = store.list_topics()
     
     # Create a simple markdown list
     content = "# Available Topics\n\n"
@@ -125,6 +129,7 @@ def get_available_folders() -> str:
     else:
         content += "No topics found.\n"
     
+    resource_cache.put("folders", signature, content)
     return content
 
 @mcp.resource("papers://{topic}")
@@ -135,32 +140,33 @@ def get_topic_papers(topic: str) -> str:
     Args:
         topic: The research topic to retrieve papers for
     """
-    topic_dir = topic.lower().replace(" ", "_")
-    papers_file = os.path.join(PAPER_DIR, topic_dir, "papers_info.json")
+    topic_dir = topic_dir_name(topic)
+    signature = file_signature(store.topic_log_path(topic_dir))
+    cached = resource_cache.get(("topic", topic), signature)
+    if cached is not None:
+        return cached
+    
+    # A torn write can only lose the record being appended, never the whole topic
+    papers_data = store.get_topic_papers(topic_dir)
     
-    if not os.path.exists(papers_file):
+    if papers_data is None:
         return f"# No papers found for topic: {topic}\n\nTry searching for papers on this topic first."
     
-    try:
-        with open(papers_file, 'r') as f:
-            papers_data = json.load(f)
-        
-        # Create markdown content with paper details
-        content = f"# Papers on {topic.replace('_', ' ').title()}\n\n"
-        content += f"Total papers: {len(papers_data)}\n\n"
-        
-        for paper_id, paper_info in papers_data.items():
-            content += f"## {paper_info['title']}\n"
-            content += f"- **Paper ID**: {paper_id}\n"
-            content += f"- **Authors**: {', '.join(paper_info['authors'])}\n"
-            content += f"- **Published**: {paper_info['published']}\n"
-            content += f"- **PDF URL**: [{paper_info['pdf_url']}]({paper_info['pdf_url']})\n\n"
-            content += f"### Summary\n{paper_info['summary'][:500]}...\n\n"
-            content += "---\n\n"
-        
-        return content
-    except json.JSONDecodeError:
-        return f"# Error reading papers data for {topic}\n\nThe papers data file is corrupted."
+    # Create markdown content with paper details
+    content = f"# Papers on {topic.replace('_', ' ').title()}\n\n"
+    content += f"Total papers: {len(papers_data)}\n\n"
+    
+    for paper_id, paper_info in papers_data.items():
+        content += f"## {paper_info['title']}\n"
+        content += f"- **Paper ID**: {paper_id}\n"
+        content += f"- **Authors**: {', '.join(paper_info['authors'])}\n"
+        content += f"- **Published**: {paper_info['published']}\n"
+        content += f"- **PDF URL**: [{paper_info['pdf_url']}]({paper_info['pdf_url']})\n\n"
+        content += f"### Summary\n{paper_info['summary'][:500]}...\n\n"
+        content += "---\n\n"
+    
+    resource_cache.put(("topic", topic), signature, content)
+    return content
 
 @mcp.prompt()
 def generate_search_prompt(topic: str, num_papers: int = 5) -> str:
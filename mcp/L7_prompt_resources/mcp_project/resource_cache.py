@@ -0,0 +1,61 @@
+import os
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """Return (mtime_ns, size) for a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class ResourceCache:
+    """
+    LRU cache for rendered resource text, bounded by entry count and total bytes.
+
+    Every entry is stored with the signature of the file it was rendered from.
+    A lookup with a different signature counts as a miss and drops the entry,
+    so callers only need a stat() to know whether the cached text is still valid.
+    """
+
+    def __init__(self, max_entries: int = 128, max_bytes: int = 8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (signature, value, size in bytes), least recently used first
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, signature: Hashable) -> Optional[str]:
+        """Return the cached value for `key` if it was stored with the same signature."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != signature:
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, signature: Hashable, value: str) -> None:
+        """Store a value, evicting least recently used entries to stay within budget."""
+        size = len(value.encode("utf-8"))
+        if key in self._entries:
+            self._drop(key)
+        # Values larger than the whole budget are never cached
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (signature, value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+
+    def _drop(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size